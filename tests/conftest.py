@@ -1,8 +1,15 @@
 import pytest
+import asyncio
 from unittest.mock import Mock, patch
 import aiohttp
 import requests
 from ulfom import UlfomClient, AsyncUlfomClient
+from ulfom.pool import session_registry
+
+@pytest.fixture(autouse=True)
+def clear_session_registry():
+    yield
+    session_registry.clear()
 
 @pytest.fixture
 def mock_response():
@@ -42,4 +49,54 @@ async def async_client(mock_aiohttp_session):
     with patch('aiohttp.ClientSession', return_value=mock_aiohttp_session):
         client = AsyncUlfomClient(base_url="https://www.ulfom.com/api/v1", api_key="test-key")
         yield client
-        await client.close() 
\ No newline at end of file
+        await client.close()
+
+class FakeAsyncClient:
+    """In-process stand-in for AsyncUlfomClient used by the bulk runner tests."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def get(self, endpoint, params=None, **kwargs):
+        self.calls.append(("GET", endpoint))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            if endpoint.startswith("/task/"):
+                return {"status": "complete", "task_id": endpoint.rsplit("/", 1)[-1]}
+            if any(endpoint.endswith(url) for url in self.fail):
+                raise RuntimeError("boom")
+            return {"endpoint": endpoint}
+        finally:
+            self.in_flight -= 1
+
+    async def get_conditional(self, endpoint, etag=None, **kwargs):
+        return True, [{"name": "extractor"}, {"name": "sitemap_crawl"}], None
+
+    async def post(self, endpoint, json=None, **kwargs):
+        self.calls.append(("POST", endpoint))
+        return {"task_id": "t-" + json["url"]}
+
+class FakeClientContext(FakeAsyncClient):
+    """FakeAsyncClient taking AsyncUlfomClient's arguments, for patching it in the CLI."""
+
+    def __init__(self, **kwargs):
+        super().__init__()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+@pytest.fixture
+def fake_async_client():
+    return FakeAsyncClient
+
+@pytest.fixture
+def fake_client_context():
+    return FakeClientContext
@@ -0,0 +1,71 @@
+import pytest
+import time
+from ulfom import JSONLSink, iter_records
+from ulfom.bulk import run_bulk, read_urls
+from ulfom.urls import DedupIndex
+
+def test_read_urls_skips_blanks_and_comments():
+    assert list(read_urls(["a\n", "\n", "# note\n", "  b  \n"])) == ["a", "b"]
+
+@pytest.mark.asyncio
+async def test_run_bulk_url_service(tmp_path, fake_async_client):
+    client = fake_async_client(fail=["u3"])
+    path = str(tmp_path / "out.jsonl")
+    urls = [f"u{i}" for i in range(20)]
+    with JSONLSink(path, fsync=False) as sink:
+        stats = await run_bulk(
+            client, "extractor", urls, sink, concurrency=4, skip={"u0"}, canonicalize=False
+        )
+    assert stats.skipped == 1
+    assert stats.succeeded == 18
+    assert stats.failed == 1
+    assert client.max_in_flight <= 4
+    records = {r["url"]: r for r in iter_records(path)}
+    assert records["u3"]["status"] == "error"
+    assert records["u1"]["result"] == {"endpoint": "/url/extractor/u1"}
+
+@pytest.mark.asyncio
+async def test_run_bulk_task_service(tmp_path, fake_async_client):
+    client = fake_async_client()
+    path = str(tmp_path / "out.jsonl")
+    with JSONLSink(path, fsync=False) as sink:
+        stats = await run_bulk(
+            client, "sitemap_crawl", ["https://a.com", "https://b.com"], sink,
+            kind="task", poll_interval=0.001
+        )
+    assert stats.succeeded == 2
+    assert ("POST", "/task/sitemap_crawl") in client.calls
+
+@pytest.mark.asyncio
+async def test_run_bulk_rejects_unknown_kind(tmp_path, fake_async_client):
+    with JSONLSink(str(tmp_path / "out.jsonl"), fsync=False) as sink:
+        with pytest.raises(ValueError):
+            await run_bulk(fake_async_client(), "x", [], sink, kind="other")
+
+@pytest.mark.asyncio
+async def test_run_bulk_canonicalizes_and_dedups(tmp_path, fake_async_client):
+    client = fake_async_client()
+    index = DedupIndex(["https://seen.com/"])
+    path = str(tmp_path / "out.jsonl")
+    urls = [
+        "http://x.com/a?b=1&a=2",
+        "HTTP://X.com:80/a?a=2&b=1#frag",
+        "https://seen.com",
+        "not a url",
+    ]
+    with JSONLSink(path, fsync=False) as sink:
+        stats = await run_bulk(client, "extractor", urls, sink, index=index)
+    assert stats.succeeded == 1
+    assert stats.duplicates == 1
+    assert stats.skipped == 1
+    assert stats.failed == 1
+    assert client.calls == [("GET", "/url/extractor/http://x.com/a%3Fa%3D2%26b%3D1")]
+    assert "http://x.com/a?a=2&b=1" in index
+
+@pytest.mark.asyncio
+async def test_run_bulk_rate_limit(tmp_path, fake_async_client):
+    start = time.monotonic()
+    with JSONLSink(str(tmp_path / "out.jsonl")) as sink:
+        stats = await run_bulk(fake_async_client(), "extractor", [f"https://a.com/{i}" for i in range(5)], sink, rate_limit=50)
+    assert stats.succeeded == 5
+    assert time.monotonic() - start >= 4 / 50
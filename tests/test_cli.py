@@ -0,0 +1,68 @@
+from unittest.mock import patch
+from ulfom import iter_records, latest_records
+from ulfom.cli import main, load_done
+
+def test_cli_bulk_resumes_from_output(tmp_path, fake_client_context):
+    input_path = tmp_path / "urls.txt"
+    input_path.write_text("https://a.com/\nhttps://b.com/\nhttps://c.com/\n")
+    output_path = tmp_path / "out.jsonl"
+    output_path.write_text('{"url": "https://a.com/", "status": "ok", "result": {}}\n{"url": "https://b')
+
+    with patch("ulfom.cli.AsyncUlfomClient", fake_client_context):
+        code = main([
+            "bulk", "--service", "extractor",
+            "--input", str(input_path), "--output", str(output_path), "--quiet"
+        ])
+
+    assert code == 0
+    urls = sorted(r["url"] for r in iter_records(str(output_path)))
+    assert urls == ["https://a.com/", "https://b.com/", "https://c.com/"]
+
+def test_load_done_retry_failed(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"url": "a", "status": "ok"}\n{"url": "b", "status": "error"}\n')
+    done = load_done(str(path))
+    assert "a" in done and "b" in done
+    done = load_done(str(path), retry_failed=True)
+    assert "a" in done and "b" not in done
+
+def test_load_done_keeps_last_record_per_url(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text(
+        '{"url": "a", "status": "error"}\n{"url": "b", "status": "ok"}\n'
+        '{"url": "a", "status": "ok"}\n{"url": "b", "status": "error"}\n'
+    )
+    done = load_done(str(path), retry_failed=True)
+    assert "a" in done and "b" not in done
+    assert [(r["url"], r["status"]) for r in latest_records(str(path))] == [("a", "ok"), ("b", "error")]
+
+def test_cli_bulk_rejects_unknown_service(tmp_path, fake_client_context):
+    input_path = tmp_path / "urls.txt"
+    input_path.write_text("https://a.com/\n")
+    output_path = tmp_path / "out.jsonl"
+
+    with patch("ulfom.cli.AsyncUlfomClient", fake_client_context):
+        code = main([
+            "bulk", "--service", "extractr",
+            "--input", str(input_path), "--output", str(output_path), "--quiet"
+        ])
+
+    assert code == 2
+    assert list(iter_records(str(output_path))) == []
+
+def test_cli_bulk_sharded_merges_shards(tmp_path, fake_client_context):
+    input_path = tmp_path / "urls.txt"
+    input_path.write_text("".join(f"https://a.com/{i}\n" for i in range(40)))
+    output_path = tmp_path / "out.jsonl"
+
+    with patch("ulfom.cli.AsyncUlfomClient", fake_client_context), \
+            patch("ulfom.sharded.AsyncUlfomClient", fake_client_context):
+        code = main([
+            "bulk", "--service", "extractor", "--processes", "2", "--rate-limit", "1000",
+            "--input", str(input_path), "--output", str(output_path), "--quiet"
+        ])
+
+    assert code == 0
+    assert not list(tmp_path.glob("out.shard-*"))
+    urls = sorted(r["url"] for r in iter_records(str(output_path)))
+    assert urls == sorted(f"https://a.com/{i}" for i in range(40))
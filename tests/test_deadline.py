@@ -0,0 +1,128 @@
+import pytest
+import re
+import time
+import asyncio
+from ulfom import (
+    UlfomClient,
+    AsyncUlfomClient,
+    TaskHelper,
+    AsyncTaskHelper,
+    AsyncURLHelper,
+    InMemoryTransport,
+    AsyncInMemoryTransport,
+    JSONLSink,
+    iter_records,
+    Deadline,
+    DeadlineExceeded
+)
+from ulfom.bulk import run_bulk, TASK_SERVICE
+
+BASE_URL = "https://www.ulfom.com/api/v1"
+
+def endless_task_server(transport):
+    """Serve tasks that never finish and accept DELETE to cancel them."""
+    cancelled = []
+    transport.add("POST", "/task/crawl", lambda request: {"task_id": "t-" + request.json["url"]})
+    transport.add("GET", re.compile(r"/task/crawl/(?P<task_id>.+)"), {"status": "running"})
+
+    @transport.route("DELETE", re.compile(r"/task/crawl/(?P<task_id>.+)"))
+    def cancel(request):
+        cancelled.append(request.match["task_id"])
+        return {"status": "cancelled"}
+
+    return cancelled
+
+def test_deadline_helpers():
+    deadline = Deadline(10)
+    assert 9 < deadline.remaining() <= 10
+    assert deadline.cap(1) == 1
+    assert deadline.cap(None) <= 10
+    assert Deadline.coerce(deadline) is deadline
+    assert Deadline.earliest(deadline, 1).timeout == 1
+    assert Deadline.earliest(deadline, 100) is deadline
+    assert Deadline.coerce(None) is None
+    expired = Deadline(0)
+    assert expired.expired() and expired.remaining() == 0
+    with pytest.raises(TimeoutError):
+        expired.check()
+    with pytest.raises(asyncio.TimeoutError):
+        expired.check()
+
+def test_sync_deadline_caps_requests_and_cancels_task():
+    transport = InMemoryTransport()
+    cancelled = endless_task_server(transport)
+    client = UlfomClient(base_url=BASE_URL, transport=transport, timeout=30)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        TaskHelper(client, poll_interval=0.05).create_and_wait("crawl", "https://a.com", deadline=0.3)
+    assert time.monotonic() - started < 1
+    assert cancelled == ["t-https://a.com"]
+    polls = [r for r in transport.requests if r.method == "GET"]
+    assert polls and all(r.timeout <= 0.3 for r in polls)
+
+    transport.requests.clear()
+    helper = TaskHelper(client, poll_interval=0.05, cancel_abandoned=False)
+    with pytest.raises(DeadlineExceeded):
+        helper.create_and_wait("crawl", "https://b.com", deadline=0.1)
+    assert cancelled == ["t-https://a.com"]
+
+@pytest.mark.asyncio
+async def test_async_deadline_cancels_task_on_expiry():
+    transport = AsyncInMemoryTransport()
+    cancelled = endless_task_server(transport)
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=transport) as client:
+        helper = AsyncTaskHelper(client, poll_interval=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await helper.create_and_wait("crawl", "https://a.com", deadline=0.3)
+        # The plain timeout is enforced the same way
+        with pytest.raises(asyncio.TimeoutError):
+            await helper.wait_for_task("crawl", "t-https://b.com", timeout=0.1)
+    assert cancelled == ["t-https://a.com", "t-https://b.com"]
+
+@pytest.mark.asyncio
+async def test_async_cancellation_cancels_task_on_server():
+    transport = AsyncInMemoryTransport()
+    cancelled = endless_task_server(transport)
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=transport) as client:
+        helper = AsyncTaskHelper(client, poll_interval=10)
+        waiter = asyncio.ensure_future(helper.create_and_wait("crawl", "https://a.com"))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    assert cancelled == ["t-https://a.com"]
+
+@pytest.mark.asyncio
+async def test_async_deadline_caps_slow_request():
+    transport = AsyncInMemoryTransport(latency=1.0)
+    transport.add("GET", re.compile(r"/url/.+"), {"ok": True})
+    async with AsyncUlfomClient(
+        base_url=["https://a.com/api", "https://b.com/api"], transport=transport, share_sessions=False
+    ) as client:
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await AsyncURLHelper(client).process_url("extractor", "https://x.com", deadline=0.2)
+        # The deadline covers failover too, so the second endpoint adds no time
+        assert time.monotonic() - started < 0.6
+
+@pytest.mark.asyncio
+async def test_run_bulk_deadline_per_url(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    transport = AsyncInMemoryTransport()
+    cancelled = endless_task_server(transport)
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=transport) as client:
+        with JSONLSink(path, fsync=False) as sink:
+            stats = await run_bulk(
+                client,
+                "crawl",
+                ["https://a.com/", "https://b.com/"],
+                sink,
+                kind=TASK_SERVICE,
+                poll_interval=0.05,
+                deadline=0.2
+            )
+            with pytest.raises(ValueError):
+                await run_bulk(client, "crawl", [], sink, deadline=0)
+    assert stats.failed == 2
+    assert all(record["status"] == "error" for record in iter_records(path))
+    assert sorted(cancelled) == ["t-https://a.com/", "t-https://b.com/"]
@@ -0,0 +1,112 @@
+import pytest
+import time
+from unittest.mock import Mock
+from ulfom import URLHelper, TaskHelper, ServiceHelper, AsyncTaskHelper
+from ulfom.discovery import (
+    ServiceRegistry,
+    AsyncServiceRegistry,
+    UnknownServiceError,
+    service_names
+)
+
+class FakeDiscoveryClient:
+    def __init__(self, listings):
+        self.listings = listings
+        self.calls = []
+
+    def get_conditional(self, endpoint, etag=None, **kwargs):
+        self.calls.append((endpoint, etag))
+        data = self.listings[endpoint]
+        if etag == "v1":
+            return False, None, etag
+        return True, data, "v1"
+
+    def get(self, endpoint, params=None, **kwargs):
+        return {"endpoint": endpoint}
+
+    post = get
+
+class FakeAsyncDiscoveryClient(FakeDiscoveryClient):
+    async def get_conditional(self, endpoint, etag=None, **kwargs):
+        return FakeDiscoveryClient.get_conditional(self, endpoint, etag, **kwargs)
+
+    async def post(self, endpoint, json=None, **kwargs):
+        return {"endpoint": endpoint}
+
+LISTINGS = {
+    "/url/services": [{"name": "extractor"}, {"name": "md"}],
+    "/task/services": {"services": ["sitemap_crawl"]},
+}
+
+def test_service_names():
+    assert service_names([{"name": "a"}, "b", {"id": "c"}]) == {"a", "b", "c"}
+    assert service_names({"data": {"a": {}, "b": {}}}) == {"a", "b"}
+    # Unrecognized shapes give no names rather than wrong ones
+    assert service_names({"items": [{"name": "a"}], "count": 1}) == set()
+    assert service_names("extractor") == set()
+    assert service_names(None) == set()
+
+def test_registry_caches_and_revalidates_with_etag():
+    client = FakeDiscoveryClient(LISTINGS)
+    registry = ServiceRegistry(client, ttl=60, background_refresh=False)
+    assert registry.list_url_services() == LISTINGS["/url/services"]
+    assert registry.list_url_services() == LISTINGS["/url/services"]
+    assert client.calls == [("/url/services", None)]
+    registry._entries["url"].fetched_at -= 120
+    assert registry.list_url_services() == LISTINGS["/url/services"]
+    assert client.calls[-1] == ("/url/services", "v1")
+    assert registry._entries["url"].age() < 1
+
+def test_registry_background_refresh_serves_stale():
+    client = FakeDiscoveryClient(LISTINGS)
+    registry = ServiceRegistry(client, ttl=60, prefetch=True)
+    assert len(client.calls) == 2
+    registry._entries["task"].fetched_at -= 120
+    assert registry.list_task_services() == LISTINGS["/task/services"]
+    for _ in range(100):
+        if len(client.calls) == 3 and not registry._refreshing:
+            break
+        time.sleep(0.01)
+    assert client.calls[-1] == ("/task/services", "v1")
+
+def test_helpers_validate_service_names():
+    client = FakeDiscoveryClient(LISTINGS)
+    registry = ServiceRegistry(client, prefetch=True)
+    url_helper = URLHelper(client, registry=registry)
+    assert url_helper.process_url("extractor", "https://a.com") == {"endpoint": "/url/extractor/https://a.com"}
+    with pytest.raises(UnknownServiceError):
+        url_helper.process_url("extractr", "https://a.com")
+    with pytest.raises(UnknownServiceError):
+        TaskHelper(client, registry=registry).create_task("sitemap", "https://a.com")
+    assert ServiceHelper(client, registry=registry).list_task_services() == LISTINGS["/task/services"]
+    assert len(client.calls) == 2
+
+def test_validate_lets_names_through_when_discovery_fails():
+    client = Mock()
+    client.get_conditional.side_effect = ConnectionError("down")
+    ServiceRegistry(client).validate("url", "anything")
+    with pytest.raises(ValueError):
+        ServiceRegistry(client).validate("other", "anything")
+
+@pytest.mark.asyncio
+async def test_async_registry_validates():
+    client = FakeAsyncDiscoveryClient(LISTINGS)
+    registry = AsyncServiceRegistry(client)
+    await registry.prefetch()
+    await registry.validate("task", "sitemap_crawl")
+    helper = AsyncTaskHelper(client, registry=registry)
+    with pytest.raises(UnknownServiceError):
+        await helper.create_task("sitemap", "https://a.com")
+    assert len(client.calls) == 2
+
+@pytest.mark.asyncio
+async def test_async_registry_prefetch_on_creation():
+    client = FakeAsyncDiscoveryClient(LISTINGS)
+    registry = AsyncServiceRegistry(client, prefetch=True)
+    await registry.validate("url", "extractor")
+    await registry.validate("task", "sitemap_crawl")
+    assert sorted(endpoint for endpoint, _ in client.calls) == ["/task/services", "/url/services"]
+
+def test_async_registry_prefetch_needs_running_loop():
+    with pytest.raises(RuntimeError):
+        AsyncServiceRegistry(FakeAsyncDiscoveryClient(LISTINGS), prefetch=True)
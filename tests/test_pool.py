@@ -0,0 +1,89 @@
+import pytest
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from ulfom import UlfomClient, AsyncUlfomClient
+from ulfom.pool import SessionRegistry, ThreadLocalSession
+
+def test_registry_refcounts_and_closes():
+    registry = SessionRegistry()
+    session = Mock()
+    assert registry.acquire("k", lambda: session) is session
+    assert registry.acquire("k", Mock) is session
+    registry.release("k")
+    session.close.assert_not_called()
+    registry.release("k")
+    session.close.assert_called_once()
+    assert registry.refcount("k") == 0
+
+def test_sync_clients_share_session():
+    first = UlfomClient(base_url="https://shared.example.com/api", api_key="test-key")
+    second = UlfomClient(base_url="https://shared.example.com/api/", api_key="test-key")
+    other = UlfomClient(base_url="https://shared.example.com/api", api_key="other-key")
+    assert first.session is second.session
+    assert other.session is not first.session
+    assert first.session.headers["Authorization"] == "Bearer test-key"
+    first.close()
+    second.close()
+    other.close()
+
+def test_sync_client_without_sharing_owns_session():
+    with UlfomClient(base_url="https://shared.example.com/api", share_sessions=False) as client:
+        shared = UlfomClient(base_url="https://shared.example.com/api")
+        assert client.session is not shared.session
+        shared.close()
+
+@pytest.mark.asyncio
+async def test_async_clients_share_session_until_last_close():
+    first = AsyncUlfomClient(base_url="https://shared.example.com/api", api_key="test-key")
+    second = AsyncUlfomClient(base_url="https://shared.example.com/api", api_key="test-key")
+    session = first.session
+    assert second.session is session
+    await first.close()
+    assert not session.closed
+    await second.close()
+    assert session.closed
+
+@pytest.mark.asyncio
+async def test_async_close_leaves_other_tasks_running():
+    other = asyncio.ensure_future(asyncio.sleep(0.05, result="done"))
+    async with AsyncUlfomClient(base_url="https://shared.example.com/api") as client:
+        client.session
+    assert await other == "done"
+
+def test_thread_local_session_per_thread():
+    pool = ThreadLocalSession(Mock)
+    main = pool.get()
+    assert pool.get() is main
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        barrier = threading.Barrier(4)
+
+        def get_session(_):
+            barrier.wait()
+            return pool.get()
+
+        sessions = list(executor.map(get_session, range(4)))
+    assert len({id(s) for s in sessions}) == 4
+    assert main not in sessions
+    assert pool.stats()["sessions_created"] == 5
+    pool.close()
+    main.close.assert_called_once()
+
+def test_sync_client_uses_session_per_thread():
+    client = UlfomClient(base_url="https://threads.example.com/api", api_key="test-key")
+    sessions = []
+
+    def record():
+        sessions.append(client.session)
+
+    threads = [threading.Thread(target=record) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(s) for s in sessions}) == 3
+    assert client.session not in sessions
+    assert all(s.headers["Authorization"] == "Bearer test-key" for s in sessions)
+    assert client.stats()["pools"]["https://threads.example.com/api"]["sessions_created"] == 4
+    client.close()
@@ -0,0 +1,107 @@
+import pytest
+import re
+import asyncio
+from unittest.mock import AsyncMock
+from ulfom import AsyncUlfomClient, AsyncURLHelper, AsyncTaskHelper, AsyncInMemoryTransport, JSONLSink
+from ulfom.bulk import run_bulk, bulk_dispatcher
+from ulfom.priority import PriorityDispatcher, HIGH, NORMAL, LOW
+
+def test_dispatcher_validates_settings():
+    with pytest.raises(ValueError):
+        PriorityDispatcher(max_concurrency=0)
+    with pytest.raises(ValueError):
+        PriorityDispatcher(max_concurrency=4, reserved={HIGH: 4})
+    with pytest.raises(ValueError):
+        PriorityDispatcher(reserved={"urgent": 1})
+    with pytest.raises(ValueError):
+        PriorityDispatcher(lane_limits={LOW: 0})
+
+@pytest.mark.asyncio
+async def test_reserved_slots_keep_capacity_for_high_priority():
+    dispatcher = PriorityDispatcher(max_concurrency=4, reserved={HIGH: 1})
+    for _ in range(3):
+        await dispatcher.acquire(LOW)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(dispatcher.acquire(LOW), 0.05)
+    await asyncio.wait_for(dispatcher.acquire(HIGH), 0.05)
+    assert dispatcher.stats()["lanes"][LOW]["in_flight"] == 3
+    assert dispatcher.stats()["lanes"][HIGH]["in_flight"] == 1
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_most_urgent_first():
+    dispatcher = PriorityDispatcher(max_concurrency=1, reserved={})
+    await dispatcher.acquire(NORMAL)
+    order = []
+
+    async def request(priority):
+        async with dispatcher.slot(priority):
+            order.append(priority)
+
+    tasks = [asyncio.ensure_future(request(p)) for p in (LOW, NORMAL, HIGH, LOW)]
+    await asyncio.sleep(0)
+    assert dispatcher.stats()["lanes"][LOW]["queued"] == 2
+    dispatcher.release(NORMAL)
+    await asyncio.gather(*tasks)
+    assert order == [HIGH, NORMAL, LOW, LOW]
+    lanes = dispatcher.stats()["lanes"]
+    assert lanes[LOW]["max_wait"] > 0
+    assert lanes[LOW]["started"] == 2
+    assert dispatcher.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_lane_limit_lets_other_lanes_through():
+    dispatcher = PriorityDispatcher(max_concurrency=10, reserved={}, lane_limits={HIGH: 1})
+    await dispatcher.acquire(HIGH)
+    blocked = asyncio.ensure_future(dispatcher.acquire(HIGH))
+    await asyncio.sleep(0)
+    await asyncio.wait_for(dispatcher.acquire(LOW), 0.05)
+    assert not blocked.done()
+    dispatcher.release(HIGH)
+    await asyncio.wait_for(blocked, 0.05)
+    assert dispatcher.stats()["lanes"][HIGH]["max_in_flight"] == 1
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place():
+    dispatcher = PriorityDispatcher(max_concurrency=1, reserved={})
+    await dispatcher.acquire(LOW)
+    waiter = asyncio.ensure_future(dispatcher.acquire(HIGH))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    dispatcher.release(LOW)
+    assert dispatcher.in_flight == 0
+    await asyncio.wait_for(dispatcher.acquire(LOW), 0.05)
+
+@pytest.mark.asyncio
+async def test_helpers_pick_priority_lanes():
+    client = AsyncUlfomClient(base_url="https://www.ulfom.com/api/v1", share_sessions=False)
+    client.get = AsyncMock(return_value={"status": "complete"})
+    client.post = AsyncMock(return_value={"task_id": "t1"})
+    await AsyncURLHelper(client).get_by_hash("extractor", "example.com", "abc")
+    assert client.get.call_args.kwargs["priority"] == HIGH
+    await AsyncTaskHelper(client, poll_interval=0).create_and_wait("crawl", "https://example.com")
+    assert client.post.call_args.kwargs["priority"] == NORMAL
+    assert client.get.call_args.kwargs["priority"] == LOW
+    with pytest.raises(ValueError):
+        AsyncURLHelper(client, priority="urgent")
+    assert client.stats()["dispatcher"]["max_concurrency"] == 100
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_run_bulk_concurrency_fits_dispatcher(tmp_path):
+    assert PriorityDispatcher().capacity(NORMAL) == 90
+    assert PriorityDispatcher(lane_limits={LOW: 50}).capacity(LOW) == 50
+    transport = AsyncInMemoryTransport(latency=0.05)
+    transport.add("GET", re.compile(r"/url/.+"), {"ok": True})
+    urls = [f"https://example.com/{n}" for n in range(400)]
+    with JSONLSink(str(tmp_path / "out.jsonl"), fsync=False) as sink:
+        async with AsyncUlfomClient(base_url="https://www.ulfom.com/api/v1", transport=transport) as client:
+            with pytest.raises(ValueError, match="capacity of 90"):
+                await run_bulk(client, "extractor", urls, sink, concurrency=200)
+        async with AsyncUlfomClient(
+            base_url="https://www.ulfom.com/api/v1", transport=transport, dispatcher=bulk_dispatcher(200)
+        ) as client:
+            stats = await run_bulk(client, "extractor", urls, sink, concurrency=200)
+            assert client.stats()["dispatcher"]["lanes"][NORMAL]["max_in_flight"] == 200
+    assert stats.succeeded == 400
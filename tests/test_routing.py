@@ -0,0 +1,108 @@
+import pytest
+import random
+import requests
+from unittest.mock import Mock
+from ulfom import UlfomClient, AsyncUlfomClient
+from ulfom.routing import EndpointRouter, normalize_base_urls
+
+def test_normalize_base_urls():
+    assert normalize_base_urls("https://a.com/api/") == ["https://a.com/api"]
+    assert normalize_base_urls(["https://a.com", "https://b.com/"]) == ["https://a.com", "https://b.com"]
+    with pytest.raises(ValueError):
+        normalize_base_urls([])
+    with pytest.raises(ValueError):
+        normalize_base_urls(["https://a.com", "b.com"])
+
+def test_router_prefers_faster_endpoint():
+    router = EndpointRouter(["https://a.com", "https://b.com"], rng=random.Random(0))
+    fast, slow = router.endpoints
+    fast.latency, slow.latency = 0.01, 0.5
+    assert all(router.candidates()[0] is fast for _ in range(10))
+
+def test_router_ejects_failing_endpoint():
+    router = EndpointRouter(["https://a.com", "https://b.com"], max_failures=2, eject_time=60)
+    bad, good = router.endpoints
+    for _ in range(2):
+        router.finish(bad, router.start(bad), False)
+    assert bad.is_ejected()
+    assert router.candidates() == [good, bad]
+    bad.ejected_until = 0
+    router.finish(bad, router.start(bad), False)
+    assert bad.is_ejected()
+    assert bad.ejections == 2
+
+def test_router_single_endpoint_never_ejected():
+    router = EndpointRouter(["https://a.com"], max_failures=1)
+    endpoint = router.endpoints[0]
+    router.finish(endpoint, router.start(endpoint), False)
+    assert not endpoint.is_ejected()
+
+def test_client_fails_over_on_connection_error():
+    client = UlfomClient(
+        base_url=["https://a.com/api", "https://b.com/api"], api_key="test-key", share_sessions=False
+    )
+    assert client._session_for("https://a.com/api") is not client._session_for("https://b.com/api")
+    ok = Mock()
+    ok.json.return_value = {"ok": True}
+    for url in client.base_urls:
+        client._session_for(url).request = Mock(
+            side_effect=requests.exceptions.ConnectionError("down") if "a.com" in url else None,
+            return_value=ok
+        )
+    for _ in range(5):
+        assert client.get("/test") == {"ok": True}
+    assert client._session_for("https://b.com/api").request.call_count == 5
+    stats = {s["base_url"]: s for s in client.router.snapshot()}
+    assert stats["https://a.com/api"]["ejected"]
+    assert stats["https://b.com/api"]["failures"] == 0
+
+def test_client_does_not_fail_over_post_on_server_error():
+    client = UlfomClient(base_url=["https://a.com", "https://b.com"], share_sessions=False)
+    error = Mock(status_code=503)
+    error.raise_for_status.side_effect = requests.exceptions.HTTPError("503")
+    sessions = [client._session_for(url) for url in client.base_urls]
+    for session in sessions:
+        session.request = Mock(return_value=error)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.post("/task/x", json={})
+    assert sum(s.request.call_count for s in sessions) == 1
+
+def test_client_fails_over_post_only_before_connecting():
+    from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+    from ulfom import InMemoryTransport
+    refused = requests.exceptions.ConnectionError(
+        MaxRetryError(None, "/task/x", NewConnectionError(None, "Connection refused"))
+    )
+    dropped = requests.exceptions.ConnectionError(ProtocolError("Connection aborted."))
+    cases = [
+        (refused, True),
+        (requests.exceptions.ConnectTimeout("connect timed out"), True),
+        # These may have reached the server, so the POST is not sent again
+        (dropped, False),
+        (requests.exceptions.ReadTimeout("read timed out"), False),
+    ]
+    for error, fails_over in cases:
+        transport = InMemoryTransport()
+
+        def create(request):
+            if "a.com" in request.base_url:
+                raise error
+            return {"task_id": "t1"}
+
+        transport.add("POST", "/task/x", create)
+        client = UlfomClient(base_url=["https://a.com", "https://b.com"], transport=transport)
+        client.router.endpoints[1].latency = 10.0
+        if fails_over:
+            assert client.post("/task/x", json={}) == {"task_id": "t1"}
+            assert [r.base_url for r in transport.requests] == ["https://a.com", "https://b.com"]
+        else:
+            with pytest.raises(type(error)):
+                client.post("/task/x", json={})
+            assert [r.base_url for r in transport.requests] == ["https://a.com"]
+
+@pytest.mark.asyncio
+async def test_async_client_accepts_base_url_list():
+    async with AsyncUlfomClient(base_url=["https://a.com/", "https://b.com"]) as client:
+        assert client.base_url == "https://a.com"
+        assert client.base_urls == ["https://a.com", "https://b.com"]
+        assert client._session_for("https://b.com") is not client.session
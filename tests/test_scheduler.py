@@ -0,0 +1,83 @@
+import pytest
+import asyncio
+import time
+from ulfom import JSONLSink
+from ulfom.bulk import run_bulk
+from ulfom.scheduler import DomainScheduler, domain_of
+
+def test_domain_of():
+    assert domain_of("https://Example.COM:8080/a") == "example.com"
+    assert domain_of("not a url") == ""
+
+@pytest.mark.asyncio
+async def test_scheduler_round_robin():
+    scheduler = DomainScheduler(per_domain_concurrency=None)
+    for url in ["http://a.com/1", "http://a.com/2", "http://a.com/3", "http://b.com/1", "http://c.com/1"]:
+        await scheduler.put(url)
+    scheduler.close()
+    order = []
+    while True:
+        url = await scheduler.get()
+        if url is None:
+            break
+        order.append(url)
+        scheduler.done(url)
+    assert order[:3] == ["http://a.com/1", "http://b.com/1", "http://c.com/1"]
+    assert order[3:] == ["http://a.com/2", "http://a.com/3"]
+
+@pytest.mark.asyncio
+async def test_scheduler_weights():
+    scheduler = DomainScheduler(per_domain_concurrency=None, weights={"a.com": 2})
+    for i in range(3):
+        await scheduler.put(f"http://a.com/{i}")
+        await scheduler.put(f"http://b.com/{i}")
+    order = [domain_of(await scheduler.get()) for _ in range(6)]
+    assert order == ["a.com", "a.com", "b.com", "a.com", "b.com", "b.com"]
+
+@pytest.mark.asyncio
+async def test_scheduler_per_domain_cap():
+    scheduler = DomainScheduler(per_domain_concurrency=1)
+    await scheduler.put("http://a.com/1")
+    await scheduler.put("http://a.com/2")
+    first = await scheduler.get()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.get(), 0.05)
+    scheduler.done(first)
+    assert await asyncio.wait_for(scheduler.get(), 1.0) == "http://a.com/2"
+
+@pytest.mark.asyncio
+async def test_scheduler_politeness_delay():
+    scheduler = DomainScheduler(per_domain_concurrency=None, politeness_delay=0.05)
+    await scheduler.put("http://a.com/1")
+    await scheduler.put("http://a.com/2")
+    start = time.monotonic()
+    await scheduler.get()
+    await scheduler.get()
+    assert time.monotonic() - start >= 0.05
+
+@pytest.mark.asyncio
+async def test_run_bulk_with_scheduler_caps_hot_domain(tmp_path, fake_async_client):
+    class TrackingClient(fake_async_client):
+        def __init__(self):
+            super().__init__()
+            self.per_domain = {}
+            self.max_per_domain = 0
+
+        async def get(self, endpoint, params=None, **kwargs):
+            domain = domain_of(endpoint.split("/", 3)[3])
+            self.per_domain[domain] = self.per_domain.get(domain, 0) + 1
+            self.max_per_domain = max(self.max_per_domain, self.per_domain[domain])
+            try:
+                return await super().get(endpoint, params, **kwargs)
+            finally:
+                self.per_domain[domain] -= 1
+
+    client = TrackingClient()
+    urls = [f"https://hot.com/{i}" for i in range(30)] + [f"https://d{i}.com/" for i in range(10)]
+    with JSONLSink(str(tmp_path / "out.jsonl"), fsync=False) as sink:
+        stats = await run_bulk(
+            client, "extractor", urls, sink, concurrency=8,
+            scheduler=DomainScheduler(per_domain_concurrency=2)
+        )
+    assert stats.succeeded == 40
+    assert client.max_per_domain <= 2
@@ -0,0 +1,85 @@
+import pytest
+import os
+import re
+from ulfom import AsyncInMemoryTransport, DedupIndex
+from ulfom.sinks import iter_records
+from ulfom.transport import Response
+from ulfom.sharded import run_sharded, shard_path, shard_paths, merge_shards
+
+BASE_URL = "https://www.ulfom.com/api/v1"
+
+def lookup(request):
+    if request.endpoint.endswith("fail"):
+        return Response(500, {"detail": "boom"})
+    return {"endpoint": request.endpoint, "pid": os.getpid()}
+
+def make_transport():
+    transport = AsyncInMemoryTransport()
+    transport.add("GET", re.compile(r"/url/extractor/.+"), lookup)
+    return transport
+
+def crash_once(request):
+    marker = os.environ["ULFOM_TEST_CRASH_MARKER"]
+    if request.endpoint.endswith("crash") and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return {"endpoint": request.endpoint}
+
+def make_crashing_transport():
+    transport = AsyncInMemoryTransport()
+    transport.add("GET", re.compile(r"/url/extractor/.+"), crash_once)
+    return transport
+
+def test_shard_paths(tmp_path):
+    output = str(tmp_path / "out.jsonl.gz")
+    assert shard_path(output, 3) == str(tmp_path / "out.shard-003.jsonl.gz")
+    assert shard_path(output, "main") == str(tmp_path / "out.shard-main.jsonl.gz")
+    assert shard_paths(output) == []
+
+def test_run_sharded_across_processes(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    urls = [f"https://example.com/{i}" for i in range(200)] + ["https://example.com/0", "ftp://bad", "https://example.com/fail"]
+    index = DedupIndex()
+    stats = run_sharded(
+        BASE_URL, "extractor", urls, output,
+        processes=3, concurrency=4, chunk_size=10, index=index,
+        transport=make_transport, start_method="fork"
+    )
+    assert stats.succeeded == 200
+    assert stats.failed == 2
+    # Counted as skipped if its first copy already reached the index
+    assert stats.duplicates + stats.skipped == 1
+    assert len(index) == 200
+    assert len(shard_paths(output)) == 4
+    workers = set()
+    for path in shard_paths(output):
+        for record in iter_records(path):
+            if record["status"] == "ok":
+                workers.add(record["result"]["pid"])
+    assert len(workers) > 1
+    assert merge_shards(output) == 202
+    assert shard_paths(output) == []
+    records = list(iter_records(output))
+    assert sorted(r["url"] for r in records if r["status"] == "ok") == sorted(set(urls[:200]))
+
+def test_run_sharded_recovers_from_worker_crash(tmp_path, monkeypatch):
+    monkeypatch.setenv("ULFOM_TEST_CRASH_MARKER", str(tmp_path / "crashed"))
+    output = str(tmp_path / "out.jsonl")
+    urls = [f"https://example.com/{i}" for i in range(50)] + ["https://example.com/crash"]
+    stats = run_sharded(
+        BASE_URL, "extractor", urls, output,
+        processes=2, concurrency=2, chunk_size=5,
+        transport=make_crashing_transport, start_method="fork"
+    )
+    assert os.path.exists(str(tmp_path / "crashed"))
+    assert stats.succeeded == 51
+    assert stats.failed == 0
+    merge_shards(output)
+    ok = [r["url"] for r in iter_records(output) if r["status"] == "ok"]
+    assert sorted(set(ok)) == sorted(urls)
+
+def test_run_sharded_validates_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        run_sharded(BASE_URL, "extractor", [], str(tmp_path / "out.jsonl"), kind="other")
+    with pytest.raises(ValueError):
+        run_sharded("not-a-url", "extractor", [], str(tmp_path / "out.jsonl"))
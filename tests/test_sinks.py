@@ -0,0 +1,101 @@
+import pytest
+import json
+import gzip
+import os
+from ulfom import JSONLSink, GzipJSONLSink, ParquetSink, open_sink, iter_records
+
+def test_jsonl_sink_batches_writes(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    sink = JSONLSink(path, batch_size=2, flush_interval=None, fsync=False)
+    sink.write({"url": "a"})
+    assert os.path.getsize(path) == 0
+    sink.write({"url": "b"})
+    assert os.path.getsize(path) > 0
+    sink.write({"url": "c"})
+    sink.close()
+    assert [r["url"] for r in iter_records(path)] == ["a", "b", "c"]
+
+def test_jsonl_sink_truncates_partial_line_on_resume(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    with open(path, "w") as f:
+        f.write('{"url": "a"}\n{"url": "b"')
+    assert [r["url"] for r in iter_records(path)] == ["a"]
+    with JSONLSink(path, fsync=False) as sink:
+        sink.write({"url": "c"})
+    assert [r["url"] for r in iter_records(path)] == ["a", "c"]
+
+def test_gzip_sink_appends_members(tmp_path):
+    path = str(tmp_path / "out.jsonl.gz")
+    with GzipJSONLSink(path, batch_size=1, fsync=False) as sink:
+        sink.consume([{"url": "a"}, {"url": "b"}])
+    with GzipJSONLSink(path, fsync=False) as sink:
+        sink.write({"url": "c"})
+    with gzip.open(path, "rt") as f:
+        assert len(f.readlines()) == 3
+    assert [r["url"] for r in iter_records(path)] == ["a", "b", "c"]
+
+def test_gzip_sink_drops_incomplete_member(tmp_path):
+    path = str(tmp_path / "out.jsonl.gz")
+    with GzipJSONLSink(path, fsync=False) as sink:
+        sink.write({"url": "a"})
+    with open(path, "ab") as f:
+        f.write(gzip.compress(b'{"url": "b"}\n')[:-6])
+    assert [r["url"] for r in iter_records(path)] == ["a"]
+    with GzipJSONLSink(path, fsync=False) as sink:
+        sink.write({"url": "c"})
+    assert [r["url"] for r in iter_records(path)] == ["a", "c"]
+
+def test_gzip_sink_refuses_non_gzip_output(tmp_path):
+    path = tmp_path / "out.gz"
+    path.write_text('{"url": "a"}\n')
+    with pytest.raises(ValueError):
+        GzipJSONLSink(str(path), fsync=False)
+    assert path.read_text() == '{"url": "a"}\n'
+
+@pytest.mark.asyncio
+async def test_sink_aconsume(tmp_path):
+    async def records():
+        for i in range(5):
+            yield {"i": i}
+
+    path = str(tmp_path / "out.jsonl")
+    with JSONLSink(path, batch_size=2, fsync=False) as sink:
+        assert await sink.aconsume(records()) == 5
+    assert [r["i"] for r in iter_records(path)] == list(range(5))
+
+def test_open_sink_infers_format(tmp_path):
+    with open_sink(str(tmp_path / "a.jsonl")) as sink:
+        assert isinstance(sink, JSONLSink)
+    with open_sink(str(tmp_path / "a.jsonl.gz")) as sink:
+        assert isinstance(sink, GzipJSONLSink)
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / "a.csv"), format="csv")
+
+def test_parquet_sink_writes_parts(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "out.parquet")
+    with ParquetSink(path, batch_size=2, fsync=False) as sink:
+        sink.consume([{"url": "a", "data": {"k": 1}}, {"url": "b", "data": None}, {"url": "c", "data": None}])
+    assert sorted(os.listdir(path)) == ["part-00000.parquet", "part-00001.parquet"]
+    assert [r["url"] for r in iter_records(path)] == ["a", "b", "c"]
+
+def test_parquet_sink_keeps_keys_missing_from_first_record(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "out.parquet")
+    with ParquetSink(path, batch_size=10, fsync=False) as sink:
+        sink.consume([
+            {"url": "a", "status": "ok", "result": {"k": 1}},
+            {"url": "b", "status": "error", "error": "boom"},
+        ])
+    records = list(iter_records(path))
+    assert json.loads(records[0]["result"]) == {"k": 1} and records[0]["error"] is None
+    assert records[1]["error"] == "boom" and records[1]["result"] is None
+
+def test_parquet_part_numbering_skips_gaps_and_removes_stale_files(tmp_path):
+    from ulfom.sinks import _prepare_part_dir
+    path = str(tmp_path / "out.parquet")
+    assert _prepare_part_dir(path) == 0
+    for name in ("part-00000.parquet", "part-00003.parquet", ".part-00004.parquet.tmp", "notes.txt"):
+        open(os.path.join(path, name), "w").close()
+    assert _prepare_part_dir(path) == 4
+    assert sorted(os.listdir(path)) == ["notes.txt", "part-00000.parquet", "part-00003.parquet"]
@@ -0,0 +1,92 @@
+import pytest
+import re
+import asyncio
+from ulfom import (
+    UlfomClient,
+    AsyncUlfomClient,
+    TaskHelper,
+    AsyncTaskHelper,
+    InMemoryTransport,
+    AsyncInMemoryTransport
+)
+
+BASE_URL = "https://www.ulfom.com/api/v1"
+PAGES = [{"url": f"https://example.com/{n}"} for n in range(7)]
+
+def crawl_server(transport, mode, done_status, page_size=2):
+    """
+    Serve a crawl that finds two more pages on every poll.
+
+    ``mode`` is "cursor", "last-cursor", "offset" or "full". "last-cursor"
+    leaves out ``next_cursor`` once the last page is served, and "full"
+    returns every page found so far, ignoring paging parameters.
+    """
+    state = {"found": 0, "params": []}
+
+    @transport.route("GET", re.compile(r"/task/sitemap_crawl/(?P<task_id>.+)"))
+    def status(request):
+        params = request.params or {}
+        state["params"].append(params)
+        state["found"] = min(len(PAGES), state["found"] + 2)
+        done = state["found"] == len(PAGES)
+        response = {"status": done_status if done else "running"}
+        if mode == "full":
+            response["result"] = PAGES[:state["found"]]
+            return response
+        start = int(params.get("cursor", params.get("offset", 0)))
+        response["result"] = PAGES[start:min(start + page_size, state["found"])]
+        end = start + len(response["result"])
+        if mode == "offset":
+            response["offset"] = start
+        elif mode == "cursor" or not (done and end == len(PAGES)):
+            response["next_cursor"] = str(end)
+        return response
+
+    return state
+
+@pytest.mark.parametrize("mode", ["cursor", "last-cursor", "offset", "full"])
+def test_iter_task_results_yields_each_page_once(mode):
+    transport = InMemoryTransport()
+    state = crawl_server(transport, mode, "completed")
+    with UlfomClient(base_url=BASE_URL, transport=transport) as client:
+        helper = TaskHelper(client, poll_interval=0)
+        assert list(helper.iter_task_results("sitemap_crawl", "t1")) == PAGES
+    assert state["params"][0] == {"offset": 0}
+    if mode in ("cursor", "last-cursor"):
+        assert {"cursor": "2"} in state["params"]
+    elif mode == "offset":
+        assert {"offset": 2} in state["params"]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["cursor", "last-cursor", "offset", "full"])
+async def test_async_iter_task_results_yields_items_while_running(mode):
+    transport = AsyncInMemoryTransport()
+    crawl_server(transport, mode, "complete")
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=transport) as client:
+        helper = AsyncTaskHelper(client, poll_interval=0.01)
+        items = []
+        async for item in helper.iter_task_results("sitemap_crawl", "t1"):
+            if not items:
+                # The first page arrives before the crawl is done
+                assert len(transport.requests) == 1
+            items.append(item)
+    assert items == PAGES
+
+@pytest.mark.asyncio
+async def test_async_iter_task_results_failure_and_deadline():
+    transport = AsyncInMemoryTransport()
+    cancelled = []
+    transport.add("GET", "/task/crawl/failed", {"status": "failed", "error": "boom", "result": [1]})
+    transport.add("GET", "/task/crawl/slow", {"status": "running", "result": [1]})
+    transport.add("DELETE", "/task/crawl/slow", lambda request: cancelled.append(request.endpoint) or {})
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=transport) as client:
+        helper = AsyncTaskHelper(client, poll_interval=0.01)
+        items = []
+        with pytest.raises(Exception, match="boom"):
+            async for item in helper.iter_task_results("crawl", "failed"):
+                items.append(item)
+        assert items == [1]
+        with pytest.raises(asyncio.TimeoutError):
+            async for item in helper.iter_task_results("crawl", "slow", deadline=0.1):
+                pass
+    assert cancelled == ["/task/crawl/slow"]
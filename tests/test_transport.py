@@ -0,0 +1,118 @@
+import pytest
+import re
+import aiohttp
+import requests
+from ulfom import (
+    UlfomClient,
+    AsyncUlfomClient,
+    TaskHelper,
+    AsyncTaskHelper,
+    AsyncURLHelper,
+    InMemoryTransport,
+    AsyncInMemoryTransport,
+    RecordReplayTransport,
+    AsyncRecordReplayTransport,
+    ReplayMissError
+)
+from ulfom.transport import Response
+
+BASE_URL = "https://www.ulfom.com/api/v1"
+
+def task_server(transport, polls_until_done=2):
+    polls = {"count": 0}
+    transport.add("POST", "/task/sitemap_crawl", lambda request: {"task_id": "t-" + request.json["url"]})
+
+    @transport.route("GET", re.compile(r"/task/sitemap_crawl/(?P<task_id>.+)"))
+    def status(request):
+        polls["count"] += 1
+        done = polls["count"] > polls_until_done
+        return {"task_id": request.match["task_id"], "status": "completed" if done else "running"}
+
+    return polls
+
+def test_in_memory_transport_drives_sync_helpers():
+    transport = InMemoryTransport()
+    polls = task_server(transport)
+    with UlfomClient(base_url=BASE_URL, transport=transport) as client:
+        result = TaskHelper(client, poll_interval=0).create_and_wait("sitemap_crawl", "https://a.com")
+    assert result == {"task_id": "t-https://a.com", "status": "completed"}
+    assert polls["count"] == 3
+    assert [r.method for r in transport.requests] == ["POST", "GET", "GET", "GET"]
+
+def test_in_memory_transport_errors_and_failover():
+    transport = InMemoryTransport()
+    transport.add("GET", "/missing", Response(404, {"detail": "gone"}))
+
+    def flaky(request):
+        if "a.com" in request.base_url:
+            raise requests.exceptions.ConnectionError("down")
+        return {"ok": True}
+
+    transport.add("GET", "/flaky", flaky)
+    client = UlfomClient(base_url=["https://a.com/api", "https://b.com/api"], transport=transport)
+    with pytest.raises(requests.exceptions.HTTPError) as info:
+        client.get("/missing")
+    assert info.value.response.status_code == 404
+    assert info.value.response.json() == {"detail": "gone"}
+    for _ in range(3):
+        assert client.get("/flaky") == {"ok": True}
+
+@pytest.mark.asyncio
+async def test_async_in_memory_transport():
+    transport = AsyncInMemoryTransport()
+    task_server(transport, polls_until_done=0)
+
+    async def lookup(request):
+        return {"url": request.endpoint}
+
+    transport.add("GET", re.compile(r"/url/extractor/.+"), lookup)
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=transport) as client:
+        assert await AsyncURLHelper(client).process_url("extractor", "https://a.com/") == {
+            "url": "/url/extractor/https://a.com/"
+        }
+        with pytest.raises(aiohttp.ClientResponseError) as info:
+            await client.get("/nothing-here")
+        assert info.value.status == 404
+    assert client._transport is None
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    live = InMemoryTransport()
+    task_server(live)
+    live.add("GET", "/missing", Response(404, {"detail": "gone"}))
+
+    with UlfomClient(base_url=BASE_URL, transport=RecordReplayTransport(path, mode="record", inner=live)) as client:
+        recorded = TaskHelper(client, poll_interval=0).create_and_wait("sitemap_crawl", "https://a.com")
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get("/missing")
+
+    with UlfomClient(base_url="https://staging.example.com", transport=RecordReplayTransport(path)) as client:
+        helper = TaskHelper(client, poll_interval=0)
+        assert helper.create_and_wait("sitemap_crawl", "https://a.com") == recorded
+        # Identical requests replay in order, then the last response repeats
+        assert helper.get_task_status("sitemap_crawl", "t-https://a.com")["status"] == "completed"
+        with pytest.raises(requests.exceptions.HTTPError) as info:
+            client.get("/missing")
+        assert info.value.response.status_code == 404
+        with pytest.raises(ReplayMissError):
+            client.get("/never-recorded")
+
+def test_replay_mode_validation(tmp_path):
+    with pytest.raises(ValueError):
+        RecordReplayTransport(str(tmp_path / "c.jsonl"), mode="rewind")
+
+@pytest.mark.asyncio
+async def test_async_record_then_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    live = AsyncInMemoryTransport()
+    task_server(live, polls_until_done=0)
+    async with AsyncUlfomClient(
+        base_url=BASE_URL, transport=AsyncRecordReplayTransport(path, mode="record", inner=live)
+    ) as client:
+        task = await AsyncTaskHelper(client).create_task("sitemap_crawl", "https://a.com")
+
+    replay = AsyncRecordReplayTransport(path, mode="auto", inner=live)
+    async with AsyncUlfomClient(base_url=BASE_URL, transport=replay) as client:
+        assert await AsyncTaskHelper(client).create_task("sitemap_crawl", "https://a.com") == task
+        await AsyncTaskHelper(client).create_task("sitemap_crawl", "https://b.com")
+    assert [r.json["url"] for r in live.requests] == ["https://a.com", "https://b.com"]
@@ -0,0 +1,60 @@
+import pytest
+from ulfom.urls import canonicalize_url, encode_url_path, DedupIndex, BloomFilter
+
+def test_canonicalize_url():
+    assert canonicalize_url("HTTP://X.com:80/a?b=2&a=1#frag") == "http://x.com/a?a=1&b=2"
+    assert canonicalize_url("https://x.com:8443") == "https://x.com:8443/"
+    assert canonicalize_url("https://x.com/a b/%7e") == "https://x.com/a%20b/%7E"
+    assert canonicalize_url("https://x.com/?q=") == "https://x.com/?q="
+
+def test_canonicalize_url_keeps_query_encoding():
+    # Invalid UTF-8 escapes stay distinct instead of becoming U+FFFD
+    assert canonicalize_url("https://x.com/?q=%ff") == "https://x.com/?q=%FF"
+    assert canonicalize_url("https://x.com/?q=%FE") == "https://x.com/?q=%FE"
+    # Values of a repeated name keep their order, only names are sorted
+    assert canonicalize_url("https://x.com/?b=1&a=2&a=1") == "https://x.com/?a=2&a=1&b=1"
+    # Flags without a value stay flags
+    assert canonicalize_url("https://x.com/?flag&a=1") == "https://x.com/?a=1&flag"
+    assert canonicalize_url("https://x.com/?q=a b&q=a+b") == "https://x.com/?q=a%20b&q=a+b"
+    assert canonicalize_url("https://x.com/?%62=1&a=2") == "https://x.com/?a=2&%62=1"
+
+def test_canonicalize_url_rejects_invalid():
+    with pytest.raises(ValueError):
+        canonicalize_url("ftp://x.com/")
+    with pytest.raises(ValueError):
+        canonicalize_url("https:///path")
+
+def test_encode_url_path():
+    assert encode_url_path("https://x.com/a?b=1#f") == "https://x.com/a%3Fb%3D1%23f"
+    assert encode_url_path("https://x.com/a%20b") == "https://x.com/a%2520b"
+
+def test_url_helper_encodes_url(client):
+    from ulfom import URLHelper
+    URLHelper(client).process_url(service="extractor", url="https://x.com/a?b=1")
+    assert client.session.request.call_args.kwargs["url"] == (
+        "https://www.ulfom.com/api/v1/url/extractor/https://x.com/a%3Fb%3D1"
+    )
+
+def test_dedup_index_save_and_load(tmp_path):
+    index = DedupIndex(["https://a.com/"])
+    assert not index.add("https://a.com/")
+    assert index.add("https://b.com/")
+    path = str(tmp_path / "index.bin")
+    index.save(path)
+    loaded = DedupIndex.load(path)
+    assert len(loaded) == 2
+    assert "https://b.com/" in loaded
+    assert "https://c.com/" not in loaded
+
+def test_bloom_filter(tmp_path):
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    urls = [f"https://x.com/{i}" for i in range(1000)]
+    for url in urls:
+        bloom.add(url)
+    assert all(url in bloom for url in urls)
+    false_positives = sum(f"https://y.com/{i}" in bloom for i in range(1000))
+    assert false_positives < 50
+    path = str(tmp_path / "bloom.bin")
+    bloom.save(path)
+    loaded = BloomFilter.load(path)
+    assert all(url in loaded for url in urls[:10])
@@ -17,6 +17,31 @@ from .helpers import (
     AsyncTaskHelper,
     AsyncServiceHelper
 )
+from .sinks import (
+    ResultSink,
+    JSONLSink,
+    GzipJSONLSink,
+    ParquetSink,
+    open_sink,
+    iter_records,
+    latest_records
+)
+from .urls import canonicalize_url, encode_url_path, DedupIndex, BloomFilter
+from .scheduler import DomainScheduler
+from .routing import EndpointRouter
+from .discovery import ServiceRegistry, AsyncServiceRegistry, UnknownServiceError
+from .priority import PriorityDispatcher
+from .sharded import run_sharded, merge_shards
+from .deadline import Deadline, DeadlineExceeded
+from .transport import (
+    Transport,
+    AsyncTransport,
+    InMemoryTransport,
+    AsyncInMemoryTransport,
+    RecordReplayTransport,
+    AsyncRecordReplayTransport,
+    ReplayMissError
+)
 
 __all__ = [
     "UlfomClient",
@@ -26,5 +51,33 @@ __all__ = [
     "ServiceHelper",
     "AsyncURLHelper",
     "AsyncTaskHelper",
-    "AsyncServiceHelper"
+    "AsyncServiceHelper",
+    "ResultSink",
+    "JSONLSink",
+    "GzipJSONLSink",
+    "ParquetSink",
+    "open_sink",
+    "iter_records",
+    "latest_records",
+    "canonicalize_url",
+    "encode_url_path",
+    "DedupIndex",
+    "BloomFilter",
+    "DomainScheduler",
+    "EndpointRouter",
+    "ServiceRegistry",
+    "AsyncServiceRegistry",
+    "UnknownServiceError",
+    "PriorityDispatcher",
+    "Transport",
+    "AsyncTransport",
+    "InMemoryTransport",
+    "AsyncInMemoryTransport",
+    "RecordReplayTransport",
+    "AsyncRecordReplayTransport",
+    "ReplayMissError",
+    "run_sharded",
+    "merge_shards",
+    "Deadline",
+    "DeadlineExceeded"
 ] 
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""
+Allow running the command-line interface with ``python -m ulfom``
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -4,43 +4,70 @@ Asynchronous client for Ulfom API
 
 import aiohttp
 import asyncio
-from typing import Optional, Dict, Any, Union
-from urllib.parse import urljoin
+from typing import Optional, Dict, Any, Union, Sequence, List, Hashable, Mapping, Tuple
+
+from .pool import async_session_registry, session_key
+from .routing import EndpointRouter, IDEMPOTENT_METHODS, normalize_base_urls
+from .priority import PriorityDispatcher, NORMAL
+from .transport import AsyncTransport, AiohttpTransport, AsyncRecordReplayTransport
+from .deadline import Deadline, DeadlineExceeded
 
 class AsyncUlfomClient:
     """Asynchronous client for interacting with the Ulfom API."""
     
     def __init__(
         self,
-        base_url: str,
+        base_url: Union[str, Sequence[str]],
         api_key: Optional[str] = None,
         timeout: int = 30,
-        session: Optional[aiohttp.ClientSession] = None
+        session: Optional[aiohttp.ClientSession] = None,
+        router: Optional[EndpointRouter] = None,
+        share_sessions: bool = True,
+        dispatcher: Optional[PriorityDispatcher] = None,
+        transport: Optional[AsyncTransport] = None
     ):
         """
         Initialize the Ulfom async client.
         
         Args:
-            base_url: The base URL of the Ulfom API
+            base_url: The base URL of the Ulfom API, or a list of equivalent
+                base URLs (e.g. regional endpoints) to route requests across
             api_key: Optional API key for authentication
             timeout: Request timeout in seconds
-            session: Optional aiohttp.ClientSession instance
+            session: Optional aiohttp.ClientSession instance, used for the first base URL
+            router: Optional EndpointRouter to customize routing across base URLs
+            share_sessions: Borrow sessions from the process-wide registry, so
+                clients with the same base URL and settings on the same event
+                loop share one connection pool
+            dispatcher: Optional PriorityDispatcher that admits requests by
+                priority; by default up to 100 requests run at once, with 10
+                slots reserved for high priority calls
+            transport: Optional AsyncTransport to send requests with instead
+                of HTTP, e.g. an AsyncInMemoryTransport or
+                AsyncRecordReplayTransport; it is closed with the client
             
         Raises:
             ValueError: If base_url is empty or invalid, or if api_key is empty
         """
-        if not base_url:
-            raise ValueError("base_url cannot be empty")
-        if not base_url.startswith(('http://', 'https://')):
-            raise ValueError("base_url must start with http:// or https://")
+        base_urls = normalize_base_urls(base_url)
         if api_key is not None and not api_key.strip():
             raise ValueError("api_key cannot be empty")
             
-        self.base_url = base_url.rstrip('/')
+        self.base_url = base_urls[0]
+        self.base_urls = base_urls
         self.api_key = api_key
         self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.router = router or EndpointRouter(base_urls)
+        self.share_sessions = share_sessions
+        self.dispatcher = dispatcher or PriorityDispatcher()
         self._session = session
-        self._loop = None
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._borrowed: List[Hashable] = []
+        self.http_transport = AiohttpTransport(self._session_for)
+        if isinstance(transport, AsyncRecordReplayTransport) and transport.inner is None:
+            transport.inner = self.http_transport
+        self._transport = transport
+        self.transport = transport or self.http_transport
         
         # Set up headers
         self._headers = {
@@ -50,57 +77,70 @@ class AsyncUlfomClient:
         if api_key:
             self._headers['Authorization'] = f'Bearer {api_key}'
     
+    def _new_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            headers=self._headers,
+            timeout=self.timeout
+        )
+    
     @property
     def session(self) -> aiohttp.ClientSession:
-        """Get or create a session."""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(
-                headers=self._headers,
-                timeout=self.timeout
-            )
-        return self._session
+        """Get or create the session of the primary endpoint."""
+        return self._session_for(self.base_url)
+    
+    def _session_for(self, base_url: str) -> aiohttp.ClientSession:
+        """Get or create the session, and so the connection pool, of an endpoint."""
+        if base_url == self.base_url and self._session is not None and not self._session.closed:
+            return self._session
+        session = self._sessions.get(base_url)
+        if session is None or session.closed:
+            if self.share_sessions:
+                key = session_key(base_url, self._headers, self.timeout.total)
+                session = async_session_registry.acquire(key, self._new_session)
+                self._borrowed.append(key)
+            else:
+                session = self._new_session()
+            self._sessions[base_url] = session
+        return session
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return per-endpoint routing statistics and per-lane dispatcher statistics."""
+        return {
+            "endpoints": self.router.snapshot(),
+            "dispatcher": self.dispatcher.stats(),
+        }
     
     async def close(self) -> None:
-        """Close the session and cleanup resources."""
-        try:
-            if self._session and not self._session.closed:
-                await self._session.close()
-        except Exception as e:
-            # Log or handle session close error
-            pass
+        """
+        Release the resources held by this client.
         
-        # Get the current event loop
-        try:
-            self._loop = asyncio.get_running_loop()
-        except RuntimeError:
-            # No running loop, nothing to clean up
-            return
-            
-        try:
-            # Get all running tasks except the current one
-            tasks = [t for t in asyncio.all_tasks(self._loop) if t is not asyncio.current_task(self._loop)]
-            
-            # Cancel all tasks
-            for task in tasks:
-                if not task.done():
-                    task.cancel()
-            
-            # Wait for all tasks to complete with a timeout
-            if tasks:
-                try:
-                    await asyncio.wait_for(
-                        asyncio.gather(*tasks, return_exceptions=True),
-                        timeout=1.0  # Add a reasonable timeout
-                    )
-                except asyncio.TimeoutError:
-                    # If tasks don't complete in time, log and continue
-                    pass
-        except Exception as e:
-            # Log or handle task cleanup error
-            pass
-        finally:
-            # Don't stop the loop - let the caller handle that
-            self._loop = None
+        Sessions created for this client are closed. Shared sessions are
+        returned to the registry and only closed once no other client uses
+        them. Other tasks on the event loop are left alone.
+        """
+        sessions = [] if self.share_sessions else list(self._sessions.values())
+        if self._session is not None:
+            sessions.append(self._session)
+        for session in sessions:
+            try:
+                if not session.closed:
+                    await session.close()
+            except Exception as e:
+                # Log or handle session close error
+                pass
+        
+        borrowed, self._borrowed = self._borrowed, []
+        for key in borrowed:
+            try:
+                await async_session_registry.release(key)
+            except Exception:
+                # Log or handle session release error
+                pass
+        self._sessions.clear()
+        
+        transport, self._transport = self._transport, None
+        if transport is not None:
+            await transport.close()
     
     async def __aenter__(self) -> 'AsyncUlfomClient':
         """Enter async context."""
@@ -121,6 +161,8 @@ class AsyncUlfomClient:
         """
         Make an async request to the Ulfom API.
         
+        See _send() for routing and failover.
+        
         Args:
             method: HTTP method (GET, POST, etc.)
             endpoint: API endpoint
@@ -134,17 +176,121 @@ class AsyncUlfomClient:
         Raises:
             aiohttp.ClientError: If the request fails
         """
-        url = urljoin(self.base_url, endpoint)
+        return (await self._send(method, endpoint, params=params, json=json, **kwargs))[2]
+    
+    async def get_conditional(
+        self,
+        endpoint: str,
+        etag: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Tuple[bool, Any, Optional[str]]:
+        """
+        Make an async GET request revalidated with ``If-None-Match``.
         
-        async with self.session.request(
-            method=method,
-            url=self.base_url + endpoint,
-            params=params,
-            json=json,
-            **kwargs
-        ) as response:
-            response.raise_for_status()
-            return await response.json()
+        Args:
+            endpoint: API endpoint
+            etag: ETag of the cached representation, if any
+            params: Query parameters
+            **kwargs: Additional arguments to pass to aiohttp
+            
+        Returns:
+            A ``(modified, data, etag)`` tuple; data is None and modified is
+            False when the server answered 304 Not Modified
+        """
+        headers = dict(kwargs.pop('headers', None) or {})
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        status, response_headers, data = await self._send(
+            'GET', endpoint, params=params, headers=headers, **kwargs
+        )
+        return status != 304, data, response_headers.get('ETag', etag)
+    
+    async def _send(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        priority: str = NORMAL,
+        deadline: Optional[Deadline] = None,
+        **kwargs
+    ) -> Tuple[int, Mapping[str, str], Any]:
+        """
+        Make an async request to the Ulfom API.
+        
+        The request first waits for a slot in its priority lane of the
+        dispatcher. With several base URLs it then goes to the endpoint
+        chosen by the router and fails over to the next one on connection
+        errors, and for idempotent methods also on timeouts and 5xx responses.
+        The transport carries the request to the chosen endpoint.
+        
+        Args:
+            method: HTTP method (GET, POST, etc.)
+            endpoint: API endpoint
+            params: Query parameters
+            json: JSON body
+            priority: Priority lane: "high", "normal" or "low"
+            deadline: Optional deadline capping the wait for a dispatcher
+                slot and the timeout of every attempt; no further endpoint is
+                tried once it has passed
+            **kwargs: Additional arguments to pass to the transport
+            
+        Returns:
+            The response status, headers and decoded JSON body; the body is
+            None for 304 Not Modified responses
+            
+        Raises:
+            aiohttp.ClientError: If the request fails
+            DeadlineExceeded: If the deadline passes before a response arrives
+        """
+        timeout = kwargs.get('timeout', self.timeout)
+        try:
+            async with self.dispatcher.slot(priority, timeout=None if deadline is None else deadline.remaining()):
+                candidates = self.router.candidates()
+                for attempt, target in enumerate(candidates):
+                    can_fail_over = attempt < len(candidates) - 1
+                    if deadline is not None:
+                        deadline.check()
+                        kwargs['timeout'] = aiohttp.ClientTimeout(total=deadline.cap(timeout.total))
+                    started = self.router.start(target)
+                    healthy: Optional[bool] = False
+                    try:
+                        response = await self.transport.request(
+                            method,
+                            target.base_url,
+                            endpoint,
+                            params=params,
+                            json=json,
+                            **kwargs
+                        )
+                        healthy = True
+                    except aiohttp.ClientResponseError as e:
+                        # Client errors say nothing about the endpoint's health
+                        healthy = e.status < 500
+                        if not healthy and can_fail_over and method.upper() in IDEMPOTENT_METHODS:
+                            continue
+                        raise
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        if can_fail_over and self._should_fail_over(method, e):
+                            continue
+                        raise
+                    except asyncio.CancelledError:
+                        healthy = None
+                        raise
+                    finally:
+                        self.router.finish(target, started, healthy)
+                    return response.status, response.headers, response.data
+        except asyncio.TimeoutError as e:
+            if deadline is None or isinstance(e, DeadlineExceeded) or not deadline.expired():
+                raise
+            raise DeadlineExceeded(f"Deadline of {deadline.timeout} seconds exceeded") from e
+    
+    @staticmethod
+    def _should_fail_over(method: str, error: Exception) -> bool:
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return True
+        return method.upper() in IDEMPOTENT_METHODS
     
     async def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
         """Make an async GET request."""
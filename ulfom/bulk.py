@@ -0,0 +1,255 @@
+"""
+Bulk processing of URL streams through the async client
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Optional, Dict, Any, Iterable, Container, Callable, AsyncIterable, AsyncIterator, List, Union
+
+from .async_client import AsyncUlfomClient
+from .helpers import AsyncURLHelper, AsyncTaskHelper
+from .priority import HIGH, NORMAL, LOW, PriorityDispatcher, check_priority
+from .ratelimit import RateLimiter
+from .scheduler import DomainScheduler
+from .sinks import ResultSink
+from .urls import DedupIndex, canonicalize_url
+
+URL_SERVICE = "url"
+TASK_SERVICE = "task"
+
+
+class BulkStats:
+    """Running counters for a bulk job."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def completed(self) -> int:
+        """Number of inputs that finished, successfully or not."""
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the job started."""
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Completed inputs per second."""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "duplicates": self.duplicates,
+            "elapsed": round(self.elapsed, 3),
+            "rate": round(self.rate, 3),
+        }
+
+
+def read_urls(lines: Iterable[str]) -> Iterable[str]:
+    """Yield URLs from text lines, skipping blank lines and ``#`` comments."""
+    for line in lines:
+        url = line.strip()
+        if url and not url.startswith('#'):
+            yield url
+
+
+def bulk_dispatcher(concurrency: int, reserved: int = 10) -> PriorityDispatcher:
+    """
+    Return a dispatcher that lets run_bulk keep ``concurrency`` requests in flight.
+
+    The default PriorityDispatcher holds back slots for the "high" lane, so
+    a client built for a bulk job needs ``reserved`` slots on top of the
+    requested concurrency.
+    """
+    return PriorityDispatcher(max_concurrency=concurrency + reserved, reserved={HIGH: reserved})
+
+
+async def run_bulk(
+    client: AsyncUlfomClient,
+    service: str,
+    urls: Union[Iterable[str], AsyncIterable[str]],
+    sink: ResultSink,
+    kind: str = URL_SERVICE,
+    concurrency: int = 64,
+    parameters: Optional[Dict[str, Any]] = None,
+    poll_interval: float = 1.0,
+    timeout: Optional[float] = None,
+    skip: Optional[Container[str]] = None,
+    canonicalize: bool = True,
+    dedup: bool = True,
+    index: Optional[Any] = None,
+    scheduler: Optional[DomainScheduler] = None,
+    stats: Optional[BulkStats] = None,
+    read_batch_size: int = 256,
+    priority: str = NORMAL,
+    rate_limit: Optional[float] = None,
+    deadline: Optional[float] = None
+) -> BulkStats:
+    """
+    Run a stream of URLs through a service and write results to a sink.
+
+    Inputs are pulled lazily and at most ``concurrency`` requests are in
+    flight, so memory use does not depend on the size of the input. Every
+    submitted input produces one record, ``{"url", "status", "result"}`` on
+    success or ``{"url", "status", "error"}`` on failure. With
+    ``canonicalize`` the recorded URL is the canonical one.
+
+    Args:
+        client: The async client to use
+        service: The service name
+        urls: Iterable of URLs, read in batches off the event loop so file
+            and stdin reads do not block requests, or an async iterable
+        sink: Sink receiving the result records
+        kind: "url" for URL services or "task" for task services
+        concurrency: Maximum number of requests in flight
+        parameters: Task parameters (task services only)
+        poll_interval: Task polling interval in seconds (task services only)
+        timeout: Per-task timeout in seconds (task services only)
+        skip: URLs to skip, e.g. those already present in the output
+        canonicalize: Whether to canonicalize URLs before submission; URLs
+            that fail to canonicalize are recorded as errors
+        dedup: Whether to skip repeats of a URL within this run
+        index: Optional DedupIndex or BloomFilter persisted across runs;
+            URLs found in it are skipped and successful ones are added
+        scheduler: Optional DomainScheduler; when given, URLs are served
+            round-robin per domain with its per-domain limits instead of in
+            input order
+        stats: Optional BulkStats instance to update, for progress display
+        read_batch_size: Number of input lines read per batch
+        priority: Priority lane of URL lookups and task submissions; task
+            status polls always use the "low" lane
+        rate_limit: Optional maximum number of URLs submitted per second
+        deadline: Optional end-to-end deadline per URL in seconds, capping
+            its request timeouts, retries and task polls; tasks running past
+            it, or still running when the job is cancelled, are cancelled on
+            the server
+
+    Returns:
+        The final BulkStats
+
+    Raises:
+        ValueError: If kind, concurrency, priority or deadline is invalid, or
+            if the client's dispatcher cannot admit ``concurrency`` requests
+            in the lanes the job uses; see bulk_dispatcher()
+    """
+    if kind not in (URL_SERVICE, TASK_SERVICE):
+        raise ValueError(f"kind must be '{URL_SERVICE}' or '{TASK_SERVICE}'")
+    check_priority(priority)
+    if concurrency < 1:
+        raise ValueError("concurrency must be positive")
+    if deadline is not None and deadline <= 0:
+        raise ValueError("deadline must be positive")
+    dispatcher = getattr(client, 'dispatcher', None)
+    if dispatcher is not None:
+        lanes = (priority, LOW) if kind == TASK_SERVICE else (priority,)
+        capacity = min(dispatcher.capacity(lane) for lane in lanes)
+        if concurrency > capacity:
+            raise ValueError(
+                f"concurrency {concurrency} exceeds the client's dispatcher capacity of {capacity}; "
+                "build the client with dispatcher=bulk_dispatcher(concurrency)"
+            )
+
+    stats = stats or BulkStats()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    loop = asyncio.get_running_loop()
+    seen = DedupIndex() if dedup else None
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+    if scheduler is not None:
+        put, get, release = scheduler.put, scheduler.get, scheduler.done
+    else:
+        put, get, release = queue.put, queue.get, lambda url: None
+
+    async def batches() -> AsyncIterator[List[str]]:
+        if hasattr(urls, '__aiter__'):
+            async for url in urls:
+                yield [url]
+            return
+        iterator = iter(urls)
+        while True:
+            batch = await loop.run_in_executor(
+                None, list, itertools.islice(iterator, read_batch_size)
+            )
+            if not batch:
+                return
+            yield batch
+
+    async def produce() -> None:
+        async for batch in batches():
+            for url in batch:
+                if canonicalize:
+                    try:
+                        url = canonicalize_url(url)
+                    except ValueError as e:
+                        stats.failed += 1
+                        sink.write({"url": url, "status": "error", "error": str(e)})
+                        continue
+                if (skip is not None and url in skip) or (index is not None and url in index):
+                    stats.skipped += 1
+                    continue
+                if seen is not None and not seen.add(url):
+                    stats.duplicates += 1
+                    continue
+                await put(url)
+        if scheduler is not None:
+            scheduler.close()
+        else:
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    def make_call() -> Callable[[str], Any]:
+        if kind == URL_SERVICE:
+            url_helper = AsyncURLHelper(client, priority=priority)
+            return lambda url: url_helper.process_url(service, url, deadline=deadline)
+        task_helper = AsyncTaskHelper(
+            client, poll_interval=poll_interval, timeout=timeout, priority=priority, poll_priority=LOW
+        )
+        return lambda url: task_helper.create_and_wait(service, url, parameters, deadline=deadline)
+
+    async def work() -> None:
+        call = make_call()
+        while True:
+            url = await get()
+            if url is None:
+                return
+            try:
+                if limiter is not None:
+                    await limiter.acquire()
+                stats.submitted += 1
+                result = await call(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.failed += 1
+                sink.write({"url": url, "status": "error", "error": str(e) or type(e).__name__})
+            else:
+                stats.succeeded += 1
+                if index is not None:
+                    index.add(url)
+                sink.write({"url": url, "status": "ok", "result": result})
+            finally:
+                release(url)
+
+    workers = [asyncio.ensure_future(work()) for _ in range(concurrency)]
+    producer = asyncio.ensure_future(produce())
+    try:
+        await asyncio.gather(producer, *workers)
+    finally:
+        for future in [producer, *workers]:
+            future.cancel()
+        # Let cancelled workers cancel their tasks on the server
+        await asyncio.gather(producer, *workers, return_exceptions=True)
+        sink.flush()
+    return stats
@@ -0,0 +1,297 @@
+"""
+Command-line interface for Ulfom
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Optional, List, Any
+
+from .async_client import AsyncUlfomClient
+from .bulk import BulkStats, run_bulk, read_urls, bulk_dispatcher, URL_SERVICE, TASK_SERVICE
+from .discovery import AsyncServiceRegistry, UnknownServiceError
+from .scheduler import DomainScheduler
+from .sharded import run_sharded, shard_paths, merge_shards
+from .sinks import open_sink, iter_records
+from .urls import DedupIndex, BloomFilter
+
+DEFAULT_BASE_URL = "https://www.ulfom.com/api/v1"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for the ``ulfom`` command."""
+    parser = argparse.ArgumentParser(prog="ulfom", description="Ulfom API command-line tools")
+    parser.add_argument(
+        "--base-url",
+        default=os.environ.get("ULFOM_BASE_URL", DEFAULT_BASE_URL),
+        help="API base URL (default: $ULFOM_BASE_URL or %(default)s)"
+    )
+    parser.add_argument(
+        "--api-key",
+        default=os.environ.get("ULFOM_API_KEY"),
+        help="API key (default: $ULFOM_API_KEY)"
+    )
+    parser.add_argument("--timeout", type=int, default=30, help="Request timeout in seconds")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bulk = subparsers.add_parser("bulk", help="Run a list of URLs through a service")
+    bulk.add_argument("--service", required=True, help="Service name, e.g. extractor")
+    bulk.add_argument(
+        "--kind",
+        choices=[URL_SERVICE, TASK_SERVICE],
+        default=URL_SERVICE,
+        help="Whether the service is a URL service or a task service"
+    )
+    bulk.add_argument("--input", default="-", help="File with one URL per line, or - for stdin")
+    bulk.add_argument(
+        "--output",
+        required=True,
+        help="Output file; .jsonl, .jsonl.gz or .parquet"
+    )
+    bulk.add_argument("--concurrency", type=int, default=64, help="Maximum requests in flight")
+    bulk.add_argument("--parameters", type=json.loads, default=None, help="Task parameters as JSON")
+    bulk.add_argument("--poll-interval", type=float, default=1.0, help="Task polling interval in seconds")
+    bulk.add_argument("--task-timeout", type=float, default=None, help="Per-task timeout in seconds")
+    bulk.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="End-to-end deadline per URL in seconds; tasks running past it are cancelled on the server"
+    )
+    bulk.add_argument("--batch-size", type=int, default=1000, help="Records buffered per write")
+    bulk.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="Do not skip URLs already present in the output"
+    )
+    bulk.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="When resuming, run URLs that previously failed again"
+    )
+    bulk.add_argument(
+        "--no-canonicalize",
+        dest="canonicalize",
+        action="store_false",
+        help="Submit URLs exactly as given instead of canonicalizing them"
+    )
+    bulk.add_argument(
+        "--no-dedup",
+        dest="dedup",
+        action="store_false",
+        help="Submit repeated URLs again within the run"
+    )
+    bulk.add_argument(
+        "--dedup-index",
+        default=None,
+        help="File recording processed URLs across runs; URLs found in it are skipped"
+    )
+    bulk.add_argument(
+        "--bloom-capacity",
+        type=int,
+        default=None,
+        help="Use a Bloom filter of this capacity for --dedup-index instead of exact hashes"
+    )
+    bulk.add_argument(
+        "--per-domain-concurrency",
+        type=int,
+        default=None,
+        help="Schedule URLs fairly per domain with at most this many in flight per domain"
+    )
+    bulk.add_argument(
+        "--politeness-delay",
+        type=float,
+        default=0.0,
+        help="Minimum seconds between two requests for the same domain"
+    )
+    bulk.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="Maximum URLs submitted per second, across all processes"
+    )
+    bulk.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Shard the input across this many worker processes, each with --concurrency requests in flight"
+    )
+    bulk.add_argument("--quiet", action="store_true", help="Disable the progress display")
+    return parser
+
+
+def load_done(path: str, retry_failed: bool = False) -> DedupIndex:
+    """
+    Collect the URLs already recorded in an existing output and its unmerged shards.
+
+    A URL run more than once has a record per attempt; only its last record
+    counts, so with ``retry_failed`` a URL whose last attempt failed is run
+    again even if an earlier one succeeded.
+    """
+    done = DedupIndex()
+    for output in [path] + shard_paths(path):
+        for record in iter_records(output):
+            if "url" not in record:
+                continue
+            if retry_failed and record.get("status") != "ok":
+                done.discard(record["url"])
+            else:
+                done.add(record["url"])
+    return done
+
+
+def load_index(args: argparse.Namespace) -> Any:
+    """Load the cross-run dedup index selected on the command line."""
+    if args.dedup_index is None:
+        return None
+    if args.bloom_capacity is not None:
+        return BloomFilter.load(args.dedup_index, capacity=args.bloom_capacity)
+    return DedupIndex.load(args.dedup_index)
+
+
+def format_progress(stats: BulkStats) -> str:
+    """Render a one-line progress summary."""
+    return (
+        f"done {stats.completed} (ok {stats.succeeded}, failed {stats.failed}) "
+        f"skipped {stats.skipped} duplicates {stats.duplicates} | {stats.rate:.1f}/s | {stats.elapsed:.0f}s"
+    )
+
+
+def _print_progress(stats: BulkStats) -> None:
+    sys.stderr.write("\r" + format_progress(stats))
+    sys.stderr.flush()
+
+
+async def _report_progress(stats: BulkStats, interval: float = 0.5) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        _print_progress(stats)
+
+
+async def _bulk(args: argparse.Namespace) -> BulkStats:
+    skip = load_done(args.output, args.retry_failed) if args.resume else None
+    index = load_index(args)
+    scheduler = None
+    if args.per_domain_concurrency is not None or args.politeness_delay > 0:
+        scheduler = DomainScheduler(
+            per_domain_concurrency=args.per_domain_concurrency,
+            politeness_delay=args.politeness_delay,
+            max_queued=max(1000, args.concurrency * 16)
+        )
+    stats = BulkStats()
+    reporter = None if args.quiet else asyncio.ensure_future(_report_progress(stats))
+    lines = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    try:
+        with open_sink(args.output, batch_size=args.batch_size) as sink:
+            async with AsyncUlfomClient(
+                base_url=args.base_url,
+                api_key=args.api_key,
+                timeout=args.timeout,
+                dispatcher=bulk_dispatcher(args.concurrency)
+            ) as client:
+                # Fail fast on a misspelled service instead of once per URL
+                await AsyncServiceRegistry(client).validate(args.kind, args.service)
+                await run_bulk(
+                    client,
+                    args.service,
+                    read_urls(lines),
+                    sink,
+                    kind=args.kind,
+                    concurrency=args.concurrency,
+                    parameters=args.parameters,
+                    poll_interval=args.poll_interval,
+                    timeout=args.task_timeout,
+                    skip=skip,
+                    canonicalize=args.canonicalize,
+                    dedup=args.dedup,
+                    index=index,
+                    scheduler=scheduler,
+                    stats=stats,
+                    rate_limit=args.rate_limit,
+                    deadline=args.deadline
+                )
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        if lines is not sys.stdin:
+            lines.close()
+        if index is not None:
+            index.save(args.dedup_index)
+    return stats
+
+
+async def _validate_service(args: argparse.Namespace) -> None:
+    async with AsyncUlfomClient(base_url=args.base_url, api_key=args.api_key, timeout=args.timeout) as client:
+        await AsyncServiceRegistry(client).validate(args.kind, args.service)
+
+
+def _bulk_sharded(args: argparse.Namespace) -> BulkStats:
+    # Fail fast on a misspelled service instead of once per URL
+    asyncio.run(_validate_service(args))
+    skip = load_done(args.output, args.retry_failed) if args.resume else None
+    index = load_index(args)
+    stats = BulkStats()
+    lines = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    try:
+        run_sharded(
+            args.base_url,
+            args.service,
+            read_urls(lines),
+            args.output,
+            api_key=args.api_key,
+            client_timeout=args.timeout,
+            processes=args.processes,
+            kind=args.kind,
+            concurrency=args.concurrency,
+            parameters=args.parameters,
+            poll_interval=args.poll_interval,
+            timeout=args.task_timeout,
+            rate_limit=args.rate_limit,
+            deadline=args.deadline,
+            skip=skip,
+            canonicalize=args.canonicalize,
+            dedup=args.dedup,
+            index=index,
+            batch_size=args.batch_size,
+            stats=stats,
+            progress=None if args.quiet else _print_progress
+        )
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if index is not None:
+            index.save(args.dedup_index)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for the ``ulfom`` command."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command != "bulk":
+        return 2
+    if args.processes > 1 and (args.per_domain_concurrency is not None or args.politeness_delay > 0):
+        parser.error("per-domain scheduling is not supported with --processes")
+    try:
+        if args.processes > 1:
+            stats = _bulk_sharded(args)
+        else:
+            stats = asyncio.run(_bulk(args))
+        # Combine worker shards, including those left by an interrupted run
+        merge_shards(args.output, batch_size=args.batch_size)
+    except KeyboardInterrupt:
+        sys.stderr.write("\nInterrupted; rerun the same command to resume\n")
+        return 130
+    except UnknownServiceError as e:
+        sys.stderr.write(f"\n{e}\n")
+        return 2
+    if not args.quiet:
+        sys.stderr.write("\r" + format_progress(stats) + "\n")
+    return 1 if stats.failed and not stats.succeeded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,51 +2,155 @@
 Synchronous client for Ulfom API
 """
 
+import functools
 import requests
-from typing import Optional, Dict, Any, Union
-from urllib.parse import urljoin
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ConnectTimeoutError
+from typing import Optional, Dict, Any, Union, Sequence, List, Hashable, Mapping, Tuple
+
+from .pool import ThreadLocalSession, session_registry, session_key
+from .routing import EndpointRouter, IDEMPOTENT_METHODS, normalize_base_urls
+from .transport import Transport, RequestsTransport, RecordReplayTransport
+from .deadline import Deadline, DeadlineExceeded
+
+def _new_session(headers: Dict[str, str]) -> requests.Session:
+    """Create a session with the given default headers."""
+    session = requests.Session()
+    session.headers.update(headers)
+    return session
 
 class UlfomClient:
-    """Synchronous client for interacting with the Ulfom API."""
+    """
+    Synchronous client for interacting with the Ulfom API.
+    
+    A client can be used from several threads at once: every thread gets its
+    own ``requests.Session`` per endpoint, all built with the same headers.
+    """
     
     def __init__(
         self,
-        base_url: str,
+        base_url: Union[str, Sequence[str]],
         api_key: Optional[str] = None,
         timeout: int = 30,
-        session: Optional[requests.Session] = None
+        session: Optional[requests.Session] = None,
+        router: Optional[EndpointRouter] = None,
+        share_sessions: bool = True,
+        transport: Optional[Transport] = None
     ):
         """
         Initialize the Ulfom client.
         
         Args:
-            base_url: The base URL of the Ulfom API
+            base_url: The base URL of the Ulfom API, or a list of equivalent
+                base URLs (e.g. regional endpoints) to route requests across
             api_key: Optional API key for authentication
             timeout: Request timeout in seconds
-            session: Optional requests.Session instance
+            session: Optional requests.Session instance, used for the first
+                base URL from every thread; the caller is responsible for
+                its thread safety
+            router: Optional EndpointRouter to customize routing across base URLs
+            share_sessions: Borrow per-thread sessions from the process-wide
+                registry, so clients with the same base URL and settings
+                share connection pools
+            transport: Optional Transport to send requests with instead of
+                HTTP, e.g. an InMemoryTransport or RecordReplayTransport; it
+                is closed with the client
             
         Raises:
             ValueError: If base_url is empty or invalid, or if api_key is empty
         """
-        if not base_url:
-            raise ValueError("base_url cannot be empty")
-        if not base_url.startswith(('http://', 'https://')):
-            raise ValueError("base_url must start with http:// or https://")
+        base_urls = normalize_base_urls(base_url)
         if api_key is not None and not api_key.strip():
             raise ValueError("api_key cannot be empty")
             
-        self.base_url = base_url.rstrip('/')
+        self.base_url = base_urls[0]
+        self.base_urls = base_urls
         self.api_key = api_key
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.router = router or EndpointRouter(base_urls)
         
-        # Set up headers
-        self.session.headers.update({
+        self.share_sessions = share_sessions
+        self._headers = {
             'Accept': 'application/json',
             'Content-Type': 'application/json',
-        })
+        }
         if api_key:
-            self.session.headers.update({'Authorization': f'Bearer {api_key}'})
+            self._headers['Authorization'] = f'Bearer {api_key}'
+        
+        # Per-thread sessions, and so connection pools, for every endpoint
+        self._session = session
+        self.pools: Dict[str, ThreadLocalSession] = {}
+        self._owned: List[Any] = []
+        self._borrowed: List[Hashable] = []
+        if session is not None:
+            self._configure_session(session)
+            self._owned.append(session)
+        for url in base_urls:
+            if share_sessions:
+                key = session_key(url, self._headers)
+                self.pools[url] = session_registry.acquire(
+                    key, lambda: ThreadLocalSession(functools.partial(_new_session, dict(self._headers)))
+                )
+                self._borrowed.append(key)
+            else:
+                self.pools[url] = ThreadLocalSession(functools.partial(_new_session, dict(self._headers)))
+                self._owned.append(self.pools[url])
+        
+        self.http_transport = RequestsTransport(self._session_for)
+        if isinstance(transport, RecordReplayTransport) and transport.inner is None:
+            transport.inner = self.http_transport
+        self.transport = transport or self.http_transport
+        if transport is not None:
+            self._owned.append(transport)
+        else:
+            # Create the constructing thread's sessions up front
+            for url in base_urls:
+                self._session_for(url)
+    
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's session for the primary endpoint."""
+        return self._session_for(self.base_url)
+    
+    def _session_for(self, base_url: str) -> requests.Session:
+        """Return the calling thread's session for an endpoint."""
+        if base_url == self.base_url and self._session is not None:
+            return self._session
+        return self.pools[base_url].get()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return per-endpoint routing statistics and session counts, across all threads."""
+        return {
+            "endpoints": self.router.snapshot(),
+            "pools": {url: pool.stats() for url, pool in self.pools.items()},
+        }
+    
+    def _configure_session(self, session: requests.Session) -> requests.Session:
+        """Set up the default headers on a session."""
+        session.headers.update(self._headers)
+        return session
+    
+    def close(self) -> None:
+        """
+        Release the resources held by this client.
+        
+        Sessions created for this client are closed. Shared sessions are
+        returned to the registry and only closed once no other client uses
+        them.
+        """
+        owned, self._owned = self._owned, []
+        for resource in owned:
+            resource.close()
+        borrowed, self._borrowed = self._borrowed, []
+        for key in borrowed:
+            session_registry.release(key)
+    
+    def __enter__(self) -> 'UlfomClient':
+        """Enter context."""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Exit context."""
+        self.close()
     
     def _request(
         self,
@@ -59,6 +163,8 @@ class UlfomClient:
         """
         Make a request to the Ulfom API.
         
+        See _send() for routing and failover.
+        
         Args:
             method: HTTP method (GET, POST, etc.)
             endpoint: API endpoint
@@ -72,18 +178,119 @@ class UlfomClient:
         Raises:
             requests.exceptions.RequestException: If the request fails
         """
-        url = urljoin(self.base_url, endpoint)
+        return (self._send(method, endpoint, params=params, json=json, **kwargs))[2]
+    
+    def get_conditional(
+        self,
+        endpoint: str,
+        etag: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Tuple[bool, Any, Optional[str]]:
+        """
+        Make a GET request revalidated with ``If-None-Match``.
         
-        response = self.session.request(
-            method=method,
-            url=self.base_url + endpoint,
-            params=params,
-            json=json,
-            timeout=self.timeout,
-            **kwargs
+        Args:
+            endpoint: API endpoint
+            etag: ETag of the cached representation, if any
+            params: Query parameters
+            **kwargs: Additional arguments to pass to requests
+            
+        Returns:
+            A ``(modified, data, etag)`` tuple; data is None and modified is
+            False when the server answered 304 Not Modified
+        """
+        headers = dict(kwargs.pop('headers', None) or {})
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        status, response_headers, data = self._send(
+            'GET', endpoint, params=params, headers=headers, **kwargs
         )
-        response.raise_for_status()
-        return response.json()
+        return status != 304, data, response_headers.get('ETag', etag)
+    
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+        **kwargs
+    ) -> Tuple[int, Mapping[str, str], Any]:
+        """
+        Make a request to the Ulfom API.
+        
+        With several base URLs the request goes to the endpoint chosen by
+        the router and fails over to the next one on connection errors, and
+        for idempotent methods also on timeouts and 5xx responses. The
+        transport carries the request to the chosen endpoint.
+        
+        Args:
+            method: HTTP method (GET, POST, etc.)
+            endpoint: API endpoint
+            params: Query parameters
+            json: JSON body
+            deadline: Optional deadline capping the timeout of every attempt;
+                no further endpoint is tried once it has passed
+            **kwargs: Additional arguments to pass to the transport
+            
+        Returns:
+            The response status, headers and decoded JSON body; the body is
+            None for 304 Not Modified responses
+            
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+            DeadlineExceeded: If the deadline passes before a response arrives
+        """
+        timeout = kwargs.pop('timeout', self.timeout)
+        candidates = self.router.candidates()
+        for attempt, target in enumerate(candidates):
+            can_fail_over = attempt < len(candidates) - 1
+            if deadline is not None:
+                deadline.check()
+            started = self.router.start(target)
+            healthy = False
+            try:
+                response = self.transport.request(
+                    method,
+                    target.base_url,
+                    endpoint,
+                    params=params,
+                    json=json,
+                    timeout=timeout if deadline is None else deadline.cap(timeout),
+                    **kwargs
+                )
+                healthy = True
+            except requests.exceptions.HTTPError as e:
+                # Client errors say nothing about the endpoint's health
+                healthy = e.response is not None and e.response.status_code < 500
+                if not healthy and can_fail_over and method.upper() in IDEMPOTENT_METHODS:
+                    continue
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"Deadline of {deadline.timeout} seconds exceeded") from e
+                if can_fail_over and self._should_fail_over(method, e):
+                    continue
+                raise
+            finally:
+                self.router.finish(target, started, healthy)
+            return response.status, response.headers, response.data
+    
+    @staticmethod
+    def _should_fail_over(method: str, error: Exception) -> bool:
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        # Other requests may already have reached the server unless the
+        # connection was never established
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+            return False
+        reason = error.args[0]
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
     
     def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
         """Make a GET request."""
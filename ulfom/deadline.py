@@ -0,0 +1,82 @@
+"""
+End-to-end deadlines for nested requests
+"""
+
+import asyncio
+import time
+from typing import Optional, Union
+
+# asyncio.TimeoutError is the builtin TimeoutError from Python 3.11 on
+_TIMEOUT_ERRORS = (TimeoutError,) if asyncio.TimeoutError is TimeoutError else (asyncio.TimeoutError, TimeoutError)
+
+
+class DeadlineExceeded(*_TIMEOUT_ERRORS):
+    """
+    Raised when an operation runs past its deadline.
+
+    Subclasses both TimeoutError and asyncio.TimeoutError, so existing
+    timeout handling catches it in sync and async code alike.
+    """
+
+
+class Deadline:
+    """
+    A point in time by which an operation and everything it calls must finish.
+
+    One Deadline is passed down through every nested call, so request
+    timeouts, failover retries and poll sleeps all draw on the same budget
+    instead of each getting the full client-wide timeout.
+    """
+
+    def __init__(self, timeout: float):
+        """
+        Args:
+            timeout: Seconds from now until the deadline
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def coerce(cls, deadline: Union['Deadline', float, None]) -> Optional['Deadline']:
+        """Return a Deadline for a Deadline, a number of seconds or None."""
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(deadline)
+
+    @classmethod
+    def earliest(
+        cls,
+        deadline: Union['Deadline', float, None],
+        timeout: Optional[float] = None
+    ) -> Optional['Deadline']:
+        """Combine a deadline with a relative timeout, keeping whichever expires first."""
+        deadline = cls.coerce(deadline)
+        if timeout is None:
+            return deadline
+        other = cls(timeout)
+        if deadline is None or other.expires_at < deadline.expires_at:
+            return other
+        return deadline
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def cap(self, timeout: Optional[float]) -> float:
+        """Return a timeout that does not run past the deadline."""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def check(self) -> None:
+        """
+        Raises:
+            DeadlineExceeded: If the deadline has passed
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.timeout} seconds exceeded")
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f})"
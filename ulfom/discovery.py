@@ -0,0 +1,330 @@
+"""
+Cached service discovery and local validation of service names
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional, Dict, Any, Set
+
+from .client import UlfomClient
+from .async_client import AsyncUlfomClient
+from .priority import HIGH
+
+URL_SERVICES = "url"
+TASK_SERVICES = "task"
+
+_ENDPOINTS = {
+    URL_SERVICES: "/url/services",
+    TASK_SERVICES: "/task/services",
+}
+
+
+class UnknownServiceError(ValueError):
+    """Raised when a service name is not in the discovered registry."""
+
+
+def service_names(data: Any) -> Set[str]:
+    """
+    Extract service names from a service listing.
+
+    Accepts a list of names, a list of objects with a ``name`` (or
+    ``service`` or ``id``) field, a mapping of names to detail objects, or
+    any of those wrapped in a ``services`` or ``data`` field. Any other
+    shape yields an empty set, which makes validation let every name
+    through instead of rejecting valid ones.
+    """
+    if isinstance(data, dict):
+        for key in ("services", "data"):
+            if isinstance(data.get(key), (list, dict)):
+                return service_names(data[key])
+        # Only a mapping of names to details; e.g. {"items": [...], "count": 2} is not one
+        if data and all(isinstance(details, dict) for details in data.values()):
+            return {str(name) for name in data}
+        return set()
+    if not isinstance(data, list):
+        return set()
+    names = set()
+    for item in data:
+        if isinstance(item, str):
+            names.add(item)
+        elif isinstance(item, dict):
+            for key in ("name", "service", "id"):
+                if isinstance(item.get(key), str):
+                    names.add(item[key])
+                    break
+    return names
+
+
+class _CacheEntry:
+    __slots__ = ('data', 'etag', 'names', 'fetched_at')
+
+    def __init__(self, data: Any, etag: Optional[str]):
+        self.data = data
+        self.etag = etag
+        self.names = service_names(data)
+        self.fetched_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+def _check_kind(kind: str) -> str:
+    if kind not in _ENDPOINTS:
+        raise ValueError(f"kind must be '{URL_SERVICES}' or '{TASK_SERVICES}'")
+    return _ENDPOINTS[kind]
+
+
+class ServiceRegistry:
+    """
+    TTL cache of the URL and task service listings.
+
+    Listings younger than ``ttl`` seconds are served from memory. Older ones
+    are revalidated with ``If-None-Match``, so an unchanged listing costs a
+    304 instead of a full response. With ``background_refresh`` a stale
+    listing is returned immediately while a background thread revalidates it.
+    """
+
+    def __init__(
+        self,
+        client: UlfomClient,
+        ttl: float = 300.0,
+        background_refresh: bool = True,
+        miss_refresh_interval: float = 30.0,
+        prefetch: bool = False
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            client: The client to fetch listings with
+            ttl: Seconds a listing is served without revalidation
+            background_refresh: Whether to revalidate stale listings in the background
+            miss_refresh_interval: Minimum age of a listing before an unknown
+                service name forces a synchronous refresh
+            prefetch: Fetch both listings now to warm the cache
+        """
+        self.client = client
+        self.ttl = ttl
+        self.background_refresh = background_refresh
+        self.miss_refresh_interval = miss_refresh_interval
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._lock = threading.Lock()
+        self._refreshing: Set[str] = set()
+        if prefetch:
+            self.prefetch()
+
+    def _refresh(self, kind: str) -> _CacheEntry:
+        endpoint = _check_kind(kind)
+        entry = self._entries.get(kind)
+        modified, data, etag = self.client.get_conditional(
+            endpoint, etag=entry.etag if entry else None
+        )
+        with self._lock:
+            if modified or entry is None:
+                entry = _CacheEntry(data, etag)
+                self._entries[kind] = entry
+            else:
+                entry.fetched_at = time.monotonic()
+        return entry
+
+    def _refresh_in_background(self, kind: str) -> None:
+        try:
+            self._refresh(kind)
+        except Exception:
+            # Keep serving the stale listing; the next access retries
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(kind)
+
+    def _entry(self, kind: str) -> _CacheEntry:
+        _check_kind(kind)
+        entry = self._entries.get(kind)
+        if entry is None:
+            return self._refresh(kind)
+        if entry.age() < self.ttl:
+            return entry
+        if not self.background_refresh:
+            return self._refresh(kind)
+        with self._lock:
+            start = kind not in self._refreshing
+            self._refreshing.add(kind)
+        if start:
+            threading.Thread(
+                target=self._refresh_in_background, args=(kind,), daemon=True
+            ).start()
+        return entry
+
+    def get(self, kind: str) -> Any:
+        """Return the listing of "url" or "task" services."""
+        return self._entry(kind).data
+
+    def list_url_services(self) -> Any:
+        """List all registered URL processing services"""
+        return self.get(URL_SERVICES)
+
+    def list_task_services(self) -> Any:
+        """List all registered task services"""
+        return self.get(TASK_SERVICES)
+
+    def prefetch(self) -> None:
+        """Fetch both listings, e.g. at startup."""
+        for kind in _ENDPOINTS:
+            self._refresh(kind)
+
+    def invalidate(self) -> None:
+        """Drop the cached listings."""
+        with self._lock:
+            self._entries.clear()
+
+    def validate(self, kind: str, service: str) -> None:
+        """
+        Check a service name against the cached listing.
+
+        An unknown name triggers one refresh, at most every
+        ``miss_refresh_interval`` seconds, in case the service was added
+        recently. If the listing cannot be fetched or parsed the name is let
+        through and the API has the final word.
+
+        Raises:
+            UnknownServiceError: If the service is not listed
+        """
+        _check_kind(kind)
+        try:
+            entry = self._entry(kind)
+            if service in entry.names or not entry.names:
+                return
+            if entry.age() >= self.miss_refresh_interval:
+                entry = self._refresh(kind)
+                if service in entry.names:
+                    return
+        except Exception:
+            return
+        raise UnknownServiceError(f"Unknown {kind} service: {service!r}")
+
+
+class AsyncServiceRegistry:
+    """
+    Async TTL cache of the URL and task service listings.
+
+    Behaves like ServiceRegistry; concurrent fetches of the same listing are
+    collapsed into one request and background revalidation runs as a task on
+    the event loop.
+    """
+
+    def __init__(
+        self,
+        client: AsyncUlfomClient,
+        ttl: float = 300.0,
+        background_refresh: bool = True,
+        miss_refresh_interval: float = 30.0,
+        prefetch: bool = False
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            client: The client to fetch listings with
+            ttl: Seconds a listing is served without revalidation
+            background_refresh: Whether to revalidate stale listings in the background
+            miss_refresh_interval: Minimum age of a listing before an unknown
+                service name forces a refresh
+            prefetch: Start fetching both listings now to warm the cache;
+                requires a running event loop
+
+        Raises:
+            RuntimeError: If prefetch is set outside a running event loop
+        """
+        self.client = client
+        self.ttl = ttl
+        self.background_refresh = background_refresh
+        self.miss_refresh_interval = miss_refresh_interval
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        if prefetch:
+            asyncio.get_running_loop()
+            for kind in _ENDPOINTS:
+                # Lookups made meanwhile wait for these fetches instead of starting their own
+                future = self._start_refresh(kind)
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    async def _fetch(self, kind: str) -> _CacheEntry:
+        entry = self._entries.get(kind)
+        # Validation sits in front of interactive calls, so don't queue behind polls
+        modified, data, etag = await self.client.get_conditional(
+            _ENDPOINTS[kind], etag=entry.etag if entry else None, priority=HIGH
+        )
+        if modified or entry is None:
+            entry = _CacheEntry(data, etag)
+            self._entries[kind] = entry
+        else:
+            entry.fetched_at = time.monotonic()
+        return entry
+
+    def _start_refresh(self, kind: str) -> asyncio.Future:
+        future = self._inflight.get(kind)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(kind))
+            self._inflight[kind] = future
+            future.add_done_callback(lambda _: self._inflight.pop(kind, None))
+        return future
+
+    async def _refresh(self, kind: str) -> _CacheEntry:
+        _check_kind(kind)
+        return await asyncio.shield(self._start_refresh(kind))
+
+    async def _entry(self, kind: str) -> _CacheEntry:
+        _check_kind(kind)
+        entry = self._entries.get(kind)
+        if entry is None or (entry.age() >= self.ttl and not self.background_refresh):
+            return await self._refresh(kind)
+        if entry.age() >= self.ttl:
+            future = self._start_refresh(kind)
+            # Errors are retried on the next access
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return entry
+
+    async def get(self, kind: str) -> Any:
+        """Return the listing of "url" or "task" services."""
+        return (await self._entry(kind)).data
+
+    async def list_url_services(self) -> Any:
+        """List all registered URL processing services"""
+        return await self.get(URL_SERVICES)
+
+    async def list_task_services(self) -> Any:
+        """List all registered task services"""
+        return await self.get(TASK_SERVICES)
+
+    async def prefetch(self) -> None:
+        """Fetch both listings concurrently, e.g. at startup."""
+        await asyncio.gather(*(self._refresh(kind) for kind in _ENDPOINTS))
+
+    def invalidate(self) -> None:
+        """Drop the cached listings."""
+        self._entries.clear()
+
+    async def validate(self, kind: str, service: str) -> None:
+        """
+        Check a service name against the cached listing.
+
+        See ServiceRegistry.validate().
+
+        Raises:
+            UnknownServiceError: If the service is not listed
+        """
+        _check_kind(kind)
+        try:
+            entry = await self._entry(kind)
+            if service in entry.names or not entry.names:
+                return
+            if entry.age() >= self.miss_refresh_interval:
+                entry = await self._refresh(kind)
+                if service in entry.names:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return
+        raise UnknownServiceError(f"Unknown {kind} service: {service!r}")
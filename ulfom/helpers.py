@@ -2,56 +2,176 @@
 Helper functions for common API operations
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union, Iterator, AsyncIterator
 import asyncio
+import json
 import time
+from urllib.parse import quote
 from .client import UlfomClient
 from .async_client import AsyncUlfomClient
+from .discovery import (
+    ServiceRegistry,
+    AsyncServiceRegistry,
+    URL_SERVICES,
+    TASK_SERVICES
+)
+from .urls import encode_url_path
+from .priority import HIGH, NORMAL, LOW, check_priority
+from .deadline import Deadline, DeadlineExceeded
+
+class _ResultPager:
+    """
+    Track which result items of a running task were already yielded.
+    
+    A server that pages results answers with a ``next_cursor``, or echoes
+    the requested ``offset``; its responses then hold only the new items.
+    A paged response without a ``next_cursor``, such as the last page of
+    many cursor APIs, leaves the cursor where it was, and the items already
+    yielded from it are skipped when it is fetched again. Otherwise every
+    response holds all items so far and new ones are found by diffing
+    against those already seen.
+    """
+    
+    def __init__(self, items_key: str):
+        self.items_key = items_key
+        self.offset = 0
+        self.cursor: Optional[str] = None
+        self.paged = False
+        self._seen: set = set()
+        # Items already yielded from responses to the current cursor
+        self._cursor_yielded = 0
+    
+    def params(self) -> Dict[str, Any]:
+        """Query parameters asking for the items after those already yielded."""
+        if self.cursor is not None:
+            return {"cursor": self.cursor}
+        return {"offset": self.offset}
+    
+    def new_items(self, status: Dict[str, Any]) -> List[Any]:
+        """Return the items of a status response that were not yielded yet."""
+        items = status.get(self.items_key)
+        if not isinstance(items, list):
+            items = []
+        next_cursor = status.get("next_cursor")
+        if self.cursor is not None or next_cursor is not None:
+            self.paged = True
+            new = items[self._cursor_yielded:] if self.cursor is not None else items
+            if next_cursor is not None and next_cursor != self.cursor:
+                self.cursor = next_cursor
+                self._cursor_yielded = 0
+            else:
+                self._cursor_yielded += len(new)
+        elif status.get("offset") == self.offset:
+            self.paged = True
+            new = items
+        else:
+            new = []
+            for item in items:
+                key = json.dumps(item, sort_keys=True, default=str)
+                if key not in self._seen:
+                    self._seen.add(key)
+                    new.append(item)
+        self.offset += len(new)
+        return new
 
 class URLHelper:
     """Helper class for URL processing operations"""
     
-    def __init__(self, client: UlfomClient):
+    def __init__(self, client: UlfomClient, registry: Optional[ServiceRegistry] = None):
         self.client = client
+        self.registry = registry
     
-    def process_url(self, service: str, url: str) -> Dict[str, Any]:
+    def process_url(self, service: str, url: str, deadline: Union[Deadline, float, None] = None) -> Dict[str, Any]:
         """Process a URL using a specific service"""
-        return self.client.get(f"/url/{service}/{url}")
+        if self.registry is not None:
+            self.registry.validate(URL_SERVICES, service)
+        return self.client.get(f"/url/{service}/{encode_url_path(url)}", deadline=Deadline.coerce(deadline))
     
-    def get_by_hash(self, service: str, domain: str, hash: str) -> Dict[str, Any]:
+    def get_by_hash(
+        self,
+        service: str,
+        domain: str,
+        hash: str,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Dict[str, Any]:
         """Retrieve content by hash for a specific domain and service"""
-        return self.client.get(f"/hash/{service}/{domain}/{hash}")
+        if self.registry is not None:
+            self.registry.validate(URL_SERVICES, service)
+        return self.client.get(
+            f"/hash/{service}/{quote(domain, safe='')}/{quote(hash, safe='')}", deadline=Deadline.coerce(deadline)
+        )
 
 class TaskHelper:
-    """Helper class for task operations"""
+    """
+    Helper class for task operations
+    
+    A task given up on, because its deadline passed or the wait was
+    interrupted, is cancelled on the server with a best-effort DELETE unless
+    ``cancel_abandoned`` is False.
+    """
     
     def __init__(
         self,
         client: UlfomClient,
         poll_interval: float = 1.0,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        registry: Optional[ServiceRegistry] = None,
+        cancel_abandoned: bool = True,
+        cancel_timeout: float = 5.0
     ):
         self.client = client
         self.poll_interval = poll_interval
         self.timeout = timeout
+        self.registry = registry
+        self.cancel_abandoned = cancel_abandoned
+        self.cancel_timeout = cancel_timeout
     
-    def create_task(self, service: str, url: str, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def create_task(
+        self,
+        service: str,
+        url: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Dict[str, Any]:
         """Create a new task"""
+        if self.registry is not None:
+            self.registry.validate(TASK_SERVICES, service)
         return self.client.post(
             f"/task/{service}",
-            json={"url": url, "parameters": parameters or {}}
+            json={"url": url, "parameters": parameters or {}},
+            deadline=Deadline.coerce(deadline)
         )
     
-    def get_task_status(self, service: str, task_id: str) -> Dict[str, Any]:
+    def get_task_status(
+        self,
+        service: str,
+        task_id: str,
+        deadline: Union[Deadline, float, None] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """Get task status and result"""
-        return self.client.get(f"/task/{service}/{task_id}")
+        return self.client.get(f"/task/{service}/{task_id}", params=params, deadline=Deadline.coerce(deadline))
+    
+    def cancel_task(self, service: str, task_id: str) -> Dict[str, Any]:
+        """Cancel a task on the server"""
+        return self.client.delete(f"/task/{service}/{task_id}", deadline=Deadline(self.cancel_timeout))
+    
+    def _abandon(self, service: str, task_id: str) -> None:
+        """Cancel a task nobody waits for any more, ignoring any error."""
+        if not self.cancel_abandoned:
+            return
+        try:
+            self.cancel_task(service, task_id)
+        except Exception:
+            pass
     
     def wait_for_task(
         self,
         service: str,
         task_id: str,
         poll_interval: Optional[float] = None,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        deadline: Union[Deadline, float, None] = None
     ) -> Dict[str, Any]:
         """
         Wait for a task to complete and return the final result.
@@ -61,34 +181,100 @@ class TaskHelper:
             task_id: The task ID to wait for
             poll_interval: How often to check the task status (in seconds)
             timeout: Maximum time to wait for the task (in seconds)
+            deadline: Optional deadline, or seconds from now, capping the
+                status requests and poll sleeps as well as the wait
             
         Returns:
             The final task result
             
         Raises:
-            TimeoutError: If the task doesn't complete within the timeout
+            TimeoutError: If the task doesn't complete within the timeout or
+                deadline; the task is then cancelled on the server
             Exception: If the task fails
         """
         poll_interval = poll_interval or self.poll_interval
-        timeout = timeout or self.timeout
+        deadline = Deadline.earliest(deadline, timeout or self.timeout)
         
-        start_time = time.time()
+        try:
+            while True:
+                status = self.get_task_status(service, task_id, deadline=deadline)
+                
+                if status["status"] == "completed":
+                    return status
+                elif status["status"] == "failed":
+                    raise Exception(f"Task failed: {status.get('error', 'Unknown error')}")
+                
+                self._sleep(poll_interval, deadline)
+        except (DeadlineExceeded, KeyboardInterrupt):
+            self._abandon(service, task_id)
+            raise
+    
+    @staticmethod
+    def _sleep(poll_interval: float, deadline: Optional[Deadline]) -> None:
+        """Sleep until the next poll, without running past the deadline."""
+        if deadline is None:
+            time.sleep(poll_interval)
+            return
+        if deadline.expired():
+            raise DeadlineExceeded(f"Task did not complete within {deadline.timeout} seconds")
+        time.sleep(deadline.cap(poll_interval))
+    
+    def iter_task_results(
+        self,
+        service: str,
+        task_id: str,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        deadline: Union[Deadline, float, None] = None,
+        items_key: str = "result"
+    ) -> Iterator[Any]:
+        """
+        Yield the result items of a task while it is still running.
         
-        while True:
-            status = self.get_task_status(service, task_id)
-            
-            if status["status"] == "completed":
-                return status
-            elif status["status"] == "failed":
-                raise Exception(f"Task failed: {status.get('error', 'Unknown error')}")
+        Each poll asks only for the items after those already yielded, with
+        the server's ``next_cursor`` or an ``offset`` query parameter. If
+        the server ignores both and returns every item so far, new items are
+        found by diffing, which skips exact repeats of an earlier item.
+        
+        Args:
+            service: The service name
+            task_id: The task ID to read results of
+            poll_interval: How often to check the task status (in seconds)
+            timeout: Maximum time to wait for the task (in seconds)
+            deadline: Optional deadline, or seconds from now, capping the
+                status requests and poll sleeps as well as the wait
+            items_key: Key of the list of result items in a status response
             
-            # Check timeout
-            if timeout is not None:
-                elapsed = time.time() - start_time
-                if elapsed >= timeout:
-                    raise TimeoutError(f"Task did not complete within {timeout} seconds")
+        Yields:
+            Result items, in the order the server returns them
             
-            time.sleep(poll_interval)
+        Raises:
+            TimeoutError: If the task doesn't complete within the timeout or
+                deadline; the task is then cancelled on the server
+            Exception: If the task fails
+        """
+        poll_interval = poll_interval or self.poll_interval
+        deadline = Deadline.earliest(deadline, timeout or self.timeout)
+        pager = _ResultPager(items_key)
+        
+        try:
+            while True:
+                status = self.get_task_status(service, task_id, deadline=deadline, params=pager.params())
+                new = pager.new_items(status)
+                yield from new
+                
+                if status["status"] == "failed":
+                    raise Exception(f"Task failed: {status.get('error', 'Unknown error')}")
+                # A full page may be followed by more, so fetch the next one right away
+                if pager.paged and new:
+                    continue
+                if status["status"] == "completed":
+                    return
+                
+                self._sleep(poll_interval, deadline)
+        except (DeadlineExceeded, KeyboardInterrupt):
+            self._abandon(service, task_id)
+            raise
     
     def create_and_wait(
         self,
@@ -96,7 +282,8 @@ class TaskHelper:
         url: str,
         parameters: Optional[Dict[str, Any]] = None,
         poll_interval: Optional[float] = None,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        deadline: Union[Deadline, float, None] = None
     ) -> Dict[str, Any]:
         """
         Create a task and wait for its completion.
@@ -107,77 +294,173 @@ class TaskHelper:
             parameters: Optional task parameters
             poll_interval: How often to check the task status (in seconds)
             timeout: Maximum time to wait for the task (in seconds)
+            deadline: Optional deadline, or seconds from now, for creating
+                the task and waiting for it together
             
         Returns:
             The final task result
         """
-        task = self.create_task(service, url, parameters)
+        deadline = Deadline.coerce(deadline)
+        task = self.create_task(service, url, parameters, deadline=deadline)
         return self.wait_for_task(
             service,
             task["task_id"],
             poll_interval=poll_interval,
-            timeout=timeout
+            timeout=timeout,
+            deadline=deadline
         )
 
 class ServiceHelper:
     """Helper class for service operations"""
     
-    def __init__(self, client: UlfomClient):
+    def __init__(self, client: UlfomClient, registry: Optional[ServiceRegistry] = None):
         self.client = client
+        self.registry = registry
     
     def list_url_services(self) -> List[Dict[str, Any]]:
         """List all registered URL processing services"""
+        if self.registry is not None:
+            return self.registry.list_url_services()
         return self.client.get("/url/services")
     
     def list_task_services(self) -> List[Dict[str, Any]]:
         """List all registered task services"""
+        if self.registry is not None:
+            return self.registry.list_task_services()
         return self.client.get("/task/services")
 
 class AsyncURLHelper:
-    """Async helper class for URL processing operations"""
+    """
+    Async helper class for URL processing operations
     
-    def __init__(self, client: AsyncUlfomClient):
+    Lookups are interactive and use the "high" priority lane by default.
+    """
+    
+    def __init__(
+        self,
+        client: AsyncUlfomClient,
+        registry: Optional[AsyncServiceRegistry] = None,
+        priority: str = HIGH
+    ):
         self.client = client
+        self.registry = registry
+        self.priority = check_priority(priority)
     
-    async def process_url(self, service: str, url: str) -> Dict[str, Any]:
+    async def process_url(
+        self,
+        service: str,
+        url: str,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Dict[str, Any]:
         """Process a URL using a specific service"""
-        return await self.client.get(f"/url/{service}/{url}")
+        if self.registry is not None:
+            await self.registry.validate(URL_SERVICES, service)
+        return await self.client.get(
+            f"/url/{service}/{encode_url_path(url)}", priority=self.priority, deadline=Deadline.coerce(deadline)
+        )
     
-    async def get_by_hash(self, service: str, domain: str, hash: str) -> Dict[str, Any]:
+    async def get_by_hash(
+        self,
+        service: str,
+        domain: str,
+        hash: str,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Dict[str, Any]:
         """Retrieve content by hash for a specific domain and service"""
-        return await self.client.get(f"/hash/{service}/{domain}/{hash}")
+        if self.registry is not None:
+            await self.registry.validate(URL_SERVICES, service)
+        return await self.client.get(
+            f"/hash/{service}/{quote(domain, safe='')}/{quote(hash, safe='')}",
+            priority=self.priority,
+            deadline=Deadline.coerce(deadline)
+        )
 
 class AsyncTaskHelper:
-    """Async helper class for task operations"""
+    """
+    Async helper class for task operations
+    
+    Tasks are created in the "normal" priority lane and polled in the "low"
+    lane, so status polls never hold up interactive calls. A task given up
+    on, because its deadline passed or the wait was cancelled, is cancelled
+    on the server with a best-effort DELETE unless ``cancel_abandoned`` is
+    False.
+    """
     
     def __init__(
         self,
         client: AsyncUlfomClient,
         poll_interval: float = 1.0,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        registry: Optional[AsyncServiceRegistry] = None,
+        priority: str = NORMAL,
+        poll_priority: str = LOW,
+        cancel_abandoned: bool = True,
+        cancel_timeout: float = 5.0
     ):
         self.client = client
         self.poll_interval = poll_interval
         self.timeout = timeout
+        self.registry = registry
+        self.priority = check_priority(priority)
+        self.poll_priority = check_priority(poll_priority)
+        self.cancel_abandoned = cancel_abandoned
+        self.cancel_timeout = cancel_timeout
         self._current_task = None
     
-    async def create_task(self, service: str, url: str, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def create_task(
+        self,
+        service: str,
+        url: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        deadline: Union[Deadline, float, None] = None
+    ) -> Dict[str, Any]:
         """Create a new task"""
+        if self.registry is not None:
+            await self.registry.validate(TASK_SERVICES, service)
         return await self.client.post(
             f"/task/{service}",
-            json={"url": url, "parameters": parameters or {}}
+            json={"url": url, "parameters": parameters or {}},
+            priority=self.priority,
+            deadline=Deadline.coerce(deadline)
         )
     
-    async def get_task_status(self, service: str, task_id: str) -> Dict[str, Any]:
+    async def get_task_status(
+        self,
+        service: str,
+        task_id: str,
+        deadline: Union[Deadline, float, None] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """Get task status and result"""
-        return await self.client.get(f"/task/{service}/{task_id}")
+        return await self.client.get(
+            f"/task/{service}/{task_id}",
+            params=params,
+            priority=self.poll_priority,
+            deadline=Deadline.coerce(deadline)
+        )
+    
+    async def cancel_task(self, service: str, task_id: str) -> Dict[str, Any]:
+        """Cancel a task on the server"""
+        return await self.client.delete(
+            f"/task/{service}/{task_id}", priority=self.priority, deadline=Deadline(self.cancel_timeout)
+        )
+    
+    async def _abandon(self, service: str, task_id: str) -> None:
+        """Cancel a task nobody waits for any more, ignoring any error."""
+        if not self.cancel_abandoned:
+            return
+        try:
+            await self.cancel_task(service, task_id)
+        except Exception:
+            pass
     
     async def wait_for_task(
         self,
         service: str,
         task_id: str,
         poll_interval: Optional[float] = None,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        deadline: Union[Deadline, float, None] = None
     ) -> Dict[str, Any]:
         """
         Wait for a task to complete and return the final result.
@@ -187,24 +470,27 @@ class AsyncTaskHelper:
             task_id: The task ID to wait for
             poll_interval: How often to check the task status (in seconds)
             timeout: Maximum time to wait for the task (in seconds)
+            deadline: Optional deadline, or seconds from now, capping the
+                status requests and poll sleeps as well as the wait
             
         Returns:
             The final task result
             
         Raises:
-            asyncio.TimeoutError: If the task doesn't complete within the timeout
-            asyncio.CancelledError: If the task is cancelled
+            asyncio.TimeoutError: If the task doesn't complete within the
+                timeout or deadline; the task is then cancelled on the server
+            asyncio.CancelledError: If the wait is cancelled; the task is then
+                cancelled on the server
             Exception: If the task fails
         """
         poll_interval = poll_interval or self.poll_interval
-        timeout = timeout or self.timeout
-        
-        start_time = asyncio.get_event_loop().time()
+        deadline = Deadline.earliest(deadline, timeout or self.timeout)
         
         try:
             while True:
                 # Create a sleep task that can be cancelled
-                sleep_task = asyncio.create_task(asyncio.sleep(poll_interval))
+                delay = poll_interval if deadline is None else deadline.cap(poll_interval)
+                sleep_task = asyncio.create_task(asyncio.sleep(delay))
                 self._current_task = sleep_task
                 
                 try:
@@ -218,7 +504,7 @@ class AsyncTaskHelper:
                     self._current_task = None
 
                 try:
-                    status = await self.get_task_status(service, task_id)
+                    status = await self.get_task_status(service, task_id, deadline=deadline)
                 except Exception as e:
                     # Ensure cleanup on any exception during status check
                     self._current_task = None
@@ -229,19 +515,79 @@ class AsyncTaskHelper:
                 elif status["status"] == "failed":
                     raise Exception(f"Task failed: {status.get('error', 'Unknown error')}")
                 
-                # Check timeout
-                if timeout is not None:
-                    elapsed = asyncio.get_event_loop().time() - start_time
-                    if elapsed >= timeout:
-                        raise asyncio.TimeoutError(f"Task did not complete within {timeout} seconds")
-        except asyncio.CancelledError:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"Task did not complete within {deadline.timeout} seconds")
+        except (DeadlineExceeded, asyncio.CancelledError):
             # Clean up any pending sleep task
             if self._current_task and not self._current_task.done():
                 self._current_task.cancel()
+            await self._abandon(service, task_id)
             raise
         finally:
             # Ensure cleanup in all cases
             self._current_task = None
+    
+    async def iter_task_results(
+        self,
+        service: str,
+        task_id: str,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        deadline: Union[Deadline, float, None] = None,
+        items_key: str = "result"
+    ) -> AsyncIterator[Any]:
+        """
+        Yield the result items of a task while it is still running.
+        
+        Each poll asks only for the items after those already yielded, with
+        the server's ``next_cursor`` or an ``offset`` query parameter. If
+        the server ignores both and returns every item so far, new items are
+        found by diffing, which skips exact repeats of an earlier item.
+        
+        Args:
+            service: The service name
+            task_id: The task ID to read results of
+            poll_interval: How often to check the task status (in seconds)
+            timeout: Maximum time to wait for the task (in seconds)
+            deadline: Optional deadline, or seconds from now, capping the
+                status requests and poll sleeps as well as the wait
+            items_key: Key of the list of result items in a status response
+            
+        Yields:
+            Result items, in the order the server returns them
+            
+        Raises:
+            asyncio.TimeoutError: If the task doesn't complete within the
+                timeout or deadline; the task is then cancelled on the server
+            asyncio.CancelledError: If the iteration is cancelled; the task is
+                then cancelled on the server
+            Exception: If the task fails
+        """
+        poll_interval = poll_interval or self.poll_interval
+        deadline = Deadline.earliest(deadline, timeout or self.timeout)
+        pager = _ResultPager(items_key)
+        
+        try:
+            while True:
+                status = await self.get_task_status(service, task_id, deadline=deadline, params=pager.params())
+                new = pager.new_items(status)
+                for item in new:
+                    yield item
+                
+                if status["status"] == "failed":
+                    raise Exception(f"Task failed: {status.get('error', 'Unknown error')}")
+                # A full page may be followed by more, so fetch the next one right away
+                if pager.paged and new:
+                    continue
+                if status["status"] == "complete":
+                    return
+                
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"Task did not complete within {deadline.timeout} seconds")
+                await asyncio.sleep(poll_interval if deadline is None else deadline.cap(poll_interval))
+        except (DeadlineExceeded, asyncio.CancelledError):
+            await self._abandon(service, task_id)
+            raise
                 
     async def create_and_wait(
         self,
@@ -249,7 +595,8 @@ class AsyncTaskHelper:
         url: str,
         parameters: Optional[Dict[str, Any]] = None,
         poll_interval: Optional[float] = None,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        deadline: Union[Deadline, float, None] = None
     ) -> Dict[str, Any]:
         """
         Create a task and wait for its completion.
@@ -260,17 +607,21 @@ class AsyncTaskHelper:
             parameters: Optional task parameters
             poll_interval: How often to check the task status (in seconds)
             timeout: Maximum time to wait for the task (in seconds)
+            deadline: Optional deadline, or seconds from now, for creating
+                the task and waiting for it together
             
         Returns:
             The final task result
         """
+        deadline = Deadline.coerce(deadline)
         try:
-            task = await self.create_task(service, url, parameters)
+            task = await self.create_task(service, url, parameters, deadline=deadline)
             return await self.wait_for_task(
                 service,
                 task["task_id"],
                 poll_interval=poll_interval,
-                timeout=timeout
+                timeout=timeout,
+                deadline=deadline
             )
         except asyncio.CancelledError:
             # Ensure cleanup on cancellation
@@ -289,13 +640,24 @@ class AsyncTaskHelper:
 class AsyncServiceHelper:
     """Async helper class for service operations"""
     
-    def __init__(self, client: AsyncUlfomClient):
+    def __init__(
+        self,
+        client: AsyncUlfomClient,
+        registry: Optional[AsyncServiceRegistry] = None,
+        priority: str = NORMAL
+    ):
         self.client = client
+        self.registry = registry
+        self.priority = check_priority(priority)
     
     async def list_url_services(self) -> List[Dict[str, Any]]:
         """List all registered URL processing services"""
-        return await self.client.get("/url/services")
+        if self.registry is not None:
+            return await self.registry.list_url_services()
+        return await self.client.get("/url/services", priority=self.priority)
     
     async def list_task_services(self) -> List[Dict[str, Any]]:
         """List all registered task services"""
-        return await self.client.get("/task/services") 
\ No newline at end of file
+        if self.registry is not None:
+            return await self.registry.list_task_services()
+        return await self.client.get("/task/services", priority=self.priority) 
\ No newline at end of file
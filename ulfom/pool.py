@@ -0,0 +1,214 @@
+"""
+Process-wide, reference-counted session registries
+
+Clients with the same base URL and settings borrow the same session, and so
+the same connection pool, instead of each opening their own. A session is
+closed when the last client borrowing it is closed.
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import aiohttp
+import requests
+
+
+class _Entry:
+    __slots__ = ('session', 'refcount')
+
+    def __init__(self, session: Any):
+        self.session = session
+        self.refcount = 0
+
+
+class ThreadLocalSession:
+    """
+    Hands out one ``requests.Session`` per thread.
+
+    ``requests.Session`` is not guaranteed to be thread-safe, and a single
+    session funnels every thread through one connection pool. Each thread
+    instead gets its own session, built by the same factory so they all
+    share the client configuration. Sessions of threads that have exited are
+    closed the next time a session is created.
+    """
+
+    def __init__(self, factory: Callable[[], requests.Session]):
+        self._factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions: List[Any] = []
+        self.sessions_created = 0
+        self.closed = False
+
+    def get(self) -> requests.Session:
+        """Return the calling thread's session, creating it if needed."""
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            return session
+        session = self._factory()
+        with self._lock:
+            alive = []
+            for thread_ref, other in self._sessions:
+                if thread_ref() is not None and thread_ref().is_alive():
+                    alive.append((thread_ref, other))
+                else:
+                    other.close()
+            alive.append((weakref.ref(threading.current_thread()), session))
+            self._sessions = alive
+            self.sessions_created += 1
+        self._local.session = session
+        return session
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of live per-thread sessions and sessions created."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "sessions_created": self.sessions_created,
+            }
+
+    def close(self) -> None:
+        """Close the sessions of every thread."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            self.closed = True
+        self._local = threading.local()
+        for _, session in sessions:
+            session.close()
+
+
+class SessionRegistry:
+    """
+    Reference-counted registry of shared sync sessions.
+
+    Entries are any objects with a ``close()`` method; ``UlfomClient``
+    registers ThreadLocalSession objects.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Borrow the session registered under key, creating it if needed.
+
+        Every acquire() must be paired with a release() of the same key.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(factory())
+                self._entries[key] = entry
+            entry.refcount += 1
+            return entry.session
+
+    def release(self, key: Hashable) -> None:
+        """Return a borrowed session, closing it if no other client uses it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            del self._entries[key]
+        entry.session.close()
+
+    def refcount(self, key: Hashable) -> int:
+        """Number of clients currently borrowing the session under key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.refcount if entry else 0
+
+    def clear(self) -> None:
+        """Close and forget every registered session."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.session.close()
+
+
+class AsyncSessionRegistry:
+    """
+    Reference-counted registry of shared ``aiohttp.ClientSession`` objects.
+
+    aiohttp sessions are bound to the event loop they were created on, so
+    sessions are registered per running loop.
+    """
+
+    def __init__(self):
+        self._loops: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, _Entry]]' = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _entries(self) -> Dict[Hashable, _Entry]:
+        loop = asyncio.get_running_loop()
+        entries = self._loops.get(loop)
+        if entries is None:
+            entries = {}
+            self._loops[loop] = entries
+        return entries
+
+    def acquire(
+        self,
+        key: Hashable,
+        factory: Callable[[], aiohttp.ClientSession]
+    ) -> aiohttp.ClientSession:
+        """
+        Borrow the session registered under key on the running loop.
+
+        A session that was closed behind the registry's back is replaced.
+        Every acquire() must be paired with a release() of the same key.
+
+        Raises:
+            RuntimeError: If no event loop is running
+        """
+        entries = self._entries()
+        entry = entries.get(key)
+        if entry is None:
+            entry = _Entry(factory())
+            entries[key] = entry
+        elif entry.session.closed:
+            entry.session = factory()
+        entry.refcount += 1
+        return entry.session
+
+    async def release(self, key: Hashable) -> None:
+        """Return a borrowed session, closing it if no other client uses it."""
+        entries = self._entries()
+        entry = entries.get(key)
+        if entry is None:
+            return
+        entry.refcount -= 1
+        if entry.refcount > 0:
+            return
+        del entries[key]
+        if not entry.session.closed:
+            await entry.session.close()
+
+    def refcount(self, key: Hashable) -> int:
+        """Number of clients on the running loop borrowing the session under key."""
+        entry = self._entries().get(key)
+        return entry.refcount if entry else 0
+
+    async def clear(self) -> None:
+        """Close and forget every session registered on the running loop."""
+        entries = self._entries()
+        sessions: List[aiohttp.ClientSession] = [entry.session for entry in entries.values()]
+        entries.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+
+
+session_registry = SessionRegistry()
+async_session_registry = AsyncSessionRegistry()
+
+
+def session_key(base_url: str, headers: Dict[str, str], *settings: Optional[Hashable]) -> Hashable:
+    """Build the registry key for a base URL, default headers and other settings."""
+    return (base_url, tuple(sorted(headers.items())), settings)
@@ -0,0 +1,247 @@
+"""
+Priority lanes for requests sharing one async client
+"""
+
+import asyncio
+import collections
+import time
+from typing import Optional, Dict, Any, Deque, Mapping, Tuple
+
+HIGH = "high"
+NORMAL = "normal"
+LOW = "low"
+
+# Lanes from most to least urgent
+PRIORITIES = (HIGH, NORMAL, LOW)
+
+
+def check_priority(priority: str) -> str:
+    """
+    Validate a priority class.
+
+    Raises:
+        ValueError: If priority is not one of "high", "normal" or "low"
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    return priority
+
+
+class LaneStats:
+    """Concurrency and queue-wait statistics of one priority lane."""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self, queued: int) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": queued,
+            "started": self.started,
+            "avg_wait": self.total_wait / self.started if self.started else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class _Slot:
+    """Async context manager holding a dispatcher slot for one request."""
+
+    __slots__ = ('_dispatcher', '_priority', '_timeout')
+
+    def __init__(self, dispatcher: 'PriorityDispatcher', priority: str, timeout: Optional[float]):
+        self._dispatcher = dispatcher
+        self._priority = priority
+        self._timeout = timeout
+
+    async def __aenter__(self) -> None:
+        if self._timeout is None:
+            await self._dispatcher.acquire(self._priority)
+        else:
+            await asyncio.wait_for(self._dispatcher.acquire(self._priority), self._timeout)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._dispatcher.release(self._priority)
+
+
+class PriorityDispatcher:
+    """
+    Admits requests of an async client by priority.
+
+    At most ``max_concurrency`` requests run at once. Waiting requests are
+    admitted strictly by lane, "high" before "normal" before "low", and in
+    arrival order within a lane, so an interactive lookup never queues behind
+    background polls. ``reserved`` slots per lane can only be used by that
+    lane or more urgent ones, which keeps capacity free for high priority
+    calls even while the lower lanes are saturated. ``lane_limits`` caps the
+    concurrency of individual lanes.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 100,
+        reserved: Optional[Mapping[str, int]] = None,
+        lane_limits: Optional[Mapping[str, int]] = None
+    ):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            max_concurrency: Maximum number of requests in flight across all
+                lanes; defaults to aiohttp's connection pool size
+            reserved: Slots per lane that less urgent lanes may not use;
+                defaults to 10 slots for "high"
+            lane_limits: Optional maximum number of requests in flight per lane
+
+        Raises:
+            ValueError: If a lane is unknown, a limit is not positive or the
+                reserved slots leave no capacity for the "low" lane
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        reserved = dict({HIGH: min(10, max_concurrency // 4)} if reserved is None else reserved)
+        lane_limits = dict(lane_limits or {})
+        for priority in list(reserved) + list(lane_limits):
+            check_priority(priority)
+        if any(n < 0 for n in reserved.values()):
+            raise ValueError("reserved slots cannot be negative")
+        if any(n < 1 for n in lane_limits.values()):
+            raise ValueError("lane limits must be at least 1")
+        if sum(reserved.values()) >= max_concurrency:
+            raise ValueError("reserved slots must leave capacity for every lane")
+
+        self.max_concurrency = max_concurrency
+        self.reserved = reserved
+        self.in_flight = 0
+        self._lanes = {priority: LaneStats(lane_limits.get(priority)) for priority in PRIORITIES}
+        self._waiters: Dict[str, Deque[Tuple[asyncio.Future, float]]] = {
+            priority: collections.deque() for priority in PRIORITIES
+        }
+        # Slots each lane may use: the total minus what more urgent lanes reserve
+        self._capacity: Dict[str, int] = {}
+        held_back = 0
+        for priority in PRIORITIES:
+            self._capacity[priority] = max_concurrency - held_back
+            held_back += reserved.get(priority, 0)
+
+    def slot(self, priority: str = NORMAL, timeout: Optional[float] = None) -> _Slot:
+        """
+        Return an async context manager that holds a slot in a lane.
+
+        Args:
+            priority: Lane to wait in
+            timeout: Optional maximum seconds to wait for the slot; entering
+                raises asyncio.TimeoutError when it runs out
+
+        Raises:
+            ValueError: If priority is unknown
+        """
+        return _Slot(self, check_priority(priority), timeout)
+
+    def capacity(self, priority: str = NORMAL) -> int:
+        """
+        Return the most requests a lane can have in flight at once.
+
+        This is ``max_concurrency`` minus the slots reserved for more urgent
+        lanes, further capped by the lane's own limit.
+
+        Raises:
+            ValueError: If priority is unknown
+        """
+        limit = self._lanes[check_priority(priority)].limit
+        capacity = self._capacity[priority]
+        return capacity if limit is None else min(capacity, limit)
+
+    def _can_start(self, priority: str) -> bool:
+        lane = self._lanes[priority]
+        if lane.limit is not None and lane.in_flight >= lane.limit:
+            return False
+        return self.in_flight < self._capacity[priority]
+
+    def _start(self, priority: str, waited: float) -> None:
+        lane = self._lanes[priority]
+        lane.in_flight += 1
+        lane.max_in_flight = max(lane.max_in_flight, lane.in_flight)
+        lane.started += 1
+        lane.total_wait += waited
+        lane.max_wait = max(lane.max_wait, waited)
+        self.in_flight += 1
+
+    def _blocked_by_lane_limit(self, priority: str) -> bool:
+        lane = self._lanes[priority]
+        return lane.limit is not None and lane.in_flight >= lane.limit
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting requests, most urgent lane first."""
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters and self._can_start(priority):
+                future, enqueued_at = waiters.popleft()
+                if not future.done():
+                    self._start(priority, time.monotonic() - enqueued_at)
+                    future.set_result(None)
+            # Less urgent lanes may only overtake a lane held back by its own limit
+            if waiters and not self._blocked_by_lane_limit(priority):
+                return
+
+    def _has_precedence(self, priority: str) -> bool:
+        """Whether no request of this or a more urgent lane is waiting for capacity."""
+        for other in PRIORITIES[:PRIORITIES.index(priority) + 1]:
+            if self._waiters[other] and (other == priority or not self._blocked_by_lane_limit(other)):
+                return False
+        return True
+
+    async def acquire(self, priority: str = NORMAL) -> None:
+        """
+        Wait for a slot in a lane.
+
+        Every acquire() must be paired with a release() of the same lane.
+
+        Raises:
+            ValueError: If priority is unknown
+        """
+        check_priority(priority)
+        if self._has_precedence(priority) and self._can_start(priority):
+            self._start(priority, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, time.monotonic())
+        self._waiters[priority].append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just before the cancellation arrived
+                self.release(priority)
+            else:
+                try:
+                    self._waiters[priority].remove(waiter)
+                except ValueError:
+                    pass
+                self._dispatch()
+            raise
+
+    def release(self, priority: str) -> None:
+        """Return a slot acquired with acquire()."""
+        self._lanes[priority].in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the in-flight count and per-lane statistics."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "lanes": {
+                priority: self._lanes[priority].as_dict(
+                    sum(not future.done() for future, _ in self._waiters[priority])
+                )
+                for priority in PRIORITIES
+            },
+        }
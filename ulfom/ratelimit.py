@@ -0,0 +1,45 @@
+"""
+Request rate limiting for bulk jobs
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Async rate limiter spacing acquisitions ``1 / rate`` seconds apart.
+
+    Up to ``burst`` acquisitions go through at once after a quiet period.
+    Waiters are served in the order they arrived.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Acquisitions per second
+            burst: Acquisitions allowed back to back (default 1)
+
+        Raises:
+            ValueError: If rate or burst is not positive
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst is not None and burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst or 1
+        self._interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for the next free slot."""
+        now = time.monotonic()
+        self._next = max(self._next, now - (self.burst - 1) * self._interval)
+        delay = self._next - now
+        self._next += self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,178 @@
+"""
+Latency-aware routing across several Ulfom API endpoints
+"""
+
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, List, Sequence, Union
+
+# Methods that can be retried on another endpoint after the request may have
+# reached the server. Other methods only fail over on connection errors.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+def normalize_base_urls(base_url: Union[str, Sequence[str]]) -> List[str]:
+    """
+    Validate one or more base URLs and strip trailing slashes.
+
+    Raises:
+        ValueError: If no base URL is given or one is empty or invalid
+    """
+    base_urls = [base_url] if isinstance(base_url, str) else list(base_url)
+    if not base_urls:
+        raise ValueError("base_url cannot be empty")
+    for url in base_urls:
+        if not url:
+            raise ValueError("base_url cannot be empty")
+        if not url.startswith(('http://', 'https://')):
+            raise ValueError("base_url must start with http:// or https://")
+    return [url.rstrip('/') for url in base_urls]
+
+
+class Endpoint:
+    """Health and latency statistics for one base URL."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def is_ejected(self, now: Optional[float] = None) -> bool:
+        """Whether the endpoint is currently taken out of rotation."""
+        return (now if now is not None else time.monotonic()) < self.ejected_until
+
+    def score(self) -> float:
+        """Expected cost of sending a request here; lower is better."""
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1 + self.in_flight) / max(0.05, 1.0 - self.error_rate)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "latency": self.latency,
+            "error_rate": round(self.error_rate, 4),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.is_ejected(),
+        }
+
+
+class EndpointRouter:
+    """
+    Chooses an endpoint for every request.
+
+    Each endpoint keeps an exponentially weighted moving average of its
+    latency and error rate. Requests go to the better of two randomly chosen
+    healthy endpoints (power of two choices), which favours fast endpoints
+    without sending all traffic to a single one. After ``max_failures``
+    consecutive failures an endpoint is ejected for ``eject_time`` seconds,
+    doubling on every repeated ejection up to ``max_eject_time``; once the
+    ejection expires the next request re-probes it.
+    """
+
+    def __init__(
+        self,
+        base_urls: Sequence[str],
+        alpha: float = 0.3,
+        max_failures: int = 3,
+        eject_time: float = 10.0,
+        max_eject_time: float = 300.0,
+        rng: Optional[random.Random] = None
+    ):
+        if not base_urls:
+            raise ValueError("base_urls cannot be empty")
+        self.endpoints = [Endpoint(url) for url in base_urls]
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def candidates(self) -> List[Endpoint]:
+        """
+        Return endpoints in the order they should be tried.
+
+        The first entry is picked by power of two choices among healthy
+        endpoints, followed by the other healthy endpoints by score and then
+        the ejected ones, so a request still has somewhere to go when every
+        endpoint is ejected.
+        """
+        if len(self.endpoints) == 1:
+            return list(self.endpoints)
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e for e in self.endpoints if not e.is_ejected(now)]
+            ejected = sorted(
+                (e for e in self.endpoints if e.is_ejected(now)),
+                key=lambda e: e.ejected_until
+            )
+            if len(healthy) >= 2:
+                a, b = self._rng.sample(healthy, 2)
+                first = a if a.score() <= b.score() else b
+                rest = sorted((e for e in healthy if e is not first), key=Endpoint.score)
+                healthy = [first] + rest
+            return healthy + ejected
+
+    def start(self, endpoint: Endpoint) -> float:
+        """Record the start of a request; returns the start time."""
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+        return time.monotonic()
+
+    def record_success(self, endpoint: Endpoint, started: float) -> None:
+        """Record a request that got a usable response."""
+        latency = time.monotonic() - started
+        with self._lock:
+            endpoint.in_flight -= 1
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.alpha * (latency - endpoint.latency)
+            endpoint.error_rate *= 1 - self.alpha
+            endpoint.consecutive_failures = 0
+            endpoint.ejections = 0
+
+    def record_failure(self, endpoint: Endpoint) -> None:
+        """Record a failed request, ejecting the endpoint if it keeps failing."""
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.failures += 1
+            endpoint.error_rate += self.alpha * (1.0 - endpoint.error_rate)
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.max_failures and len(self.endpoints) > 1:
+                backoff = min(self.max_eject_time, self.eject_time * 2 ** endpoint.ejections)
+                endpoint.ejected_until = time.monotonic() + backoff
+                endpoint.ejections += 1
+                # Let the endpoint be re-probed by a single request once the
+                # ejection expires instead of waiting for max_failures again
+                endpoint.consecutive_failures = self.max_failures - 1
+
+    def finish(self, endpoint: Endpoint, started: float, healthy: Optional[bool]) -> None:
+        """
+        Record the outcome of a request started with start().
+
+        ``healthy`` is None for requests abandoned by the caller, e.g. on
+        cancellation, which say nothing about the endpoint.
+        """
+        if healthy is None:
+            with self._lock:
+                endpoint.in_flight -= 1
+        elif healthy:
+            self.record_success(endpoint, started)
+        else:
+            self.record_failure(endpoint)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return the current statistics of every endpoint."""
+        with self._lock:
+            return [endpoint.as_dict() for endpoint in self.endpoints]
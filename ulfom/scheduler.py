@@ -0,0 +1,203 @@
+"""
+Per-domain fair scheduling for bulk submission
+"""
+
+import asyncio
+import collections
+import time
+from typing import Optional, Dict, Callable, Deque
+from urllib.parse import urlsplit
+
+
+def domain_of(url: str) -> str:
+    """Return the lowercased host of a URL, or an empty string if it has none."""
+    return (urlsplit(url).hostname or '').rstrip('.')
+
+
+class _DomainQueue:
+    __slots__ = ('items', 'active', 'next_start', 'weight', 'turns')
+
+    def __init__(self, weight: int):
+        self.items: Deque[str] = collections.deque()
+        self.active = 0
+        self.next_start = 0.0
+        self.weight = weight
+        self.turns = weight
+
+
+class DomainScheduler:
+    """
+    Fair scheduler keeping one queue per target domain.
+
+    Domains are served round-robin, a domain with weight ``n`` getting up to
+    ``n`` consecutive turns. A domain is only served while it has fewer than
+    ``per_domain_concurrency`` URLs in flight and at least
+    ``politeness_delay`` seconds have passed since its last URL started, so a
+    domain dominating the input cannot monopolize the workers while the other
+    domains sit idle.
+
+    Producers call put() and close(); workers call get() and then done() with
+    the URL once its request has finished.
+    """
+
+    def __init__(
+        self,
+        per_domain_concurrency: Optional[int] = 4,
+        politeness_delay: float = 0.0,
+        weights: Optional[Dict[str, int]] = None,
+        default_weight: int = 1,
+        max_queued: int = 10000,
+        key: Callable[[str], str] = domain_of
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            per_domain_concurrency: Maximum in-flight URLs per domain (None for no cap)
+            politeness_delay: Minimum seconds between two URLs of the same domain
+            weights: Optional per-domain weights for weighted round-robin
+            default_weight: Weight of domains not listed in weights
+            max_queued: Maximum URLs buffered across all domains; put() waits
+                when the buffer is full
+            key: Function mapping a URL to its scheduling key
+
+        Raises:
+            ValueError: If a limit is not positive
+        """
+        if per_domain_concurrency is not None and per_domain_concurrency < 1:
+            raise ValueError("per_domain_concurrency must be positive")
+        if politeness_delay < 0:
+            raise ValueError("politeness_delay cannot be negative")
+        if default_weight < 1 or any(weight < 1 for weight in (weights or {}).values()):
+            raise ValueError("weights must be positive")
+        if max_queued < 1:
+            raise ValueError("max_queued must be positive")
+
+        self.per_domain_concurrency = per_domain_concurrency
+        self.politeness_delay = politeness_delay
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.max_queued = max_queued
+        self.key = key
+        self._domains: Dict[str, _DomainQueue] = {}
+        self._ring: Deque[str] = collections.deque()
+        self._queued = 0
+        self._closed = False
+        self._changed: Optional[asyncio.Event] = None
+
+    @property
+    def queued(self) -> int:
+        """Number of URLs waiting to be served."""
+        return self._queued
+
+    def in_flight(self, domain: str) -> int:
+        """Number of URLs of a domain currently being processed."""
+        state = self._domains.get(domain)
+        return state.active if state else 0
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    async def _wait(self, timeout: Optional[float] = None) -> None:
+        # Created lazily so the event binds to the loop running the workers
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def put(self, url: str) -> None:
+        """
+        Queue a URL, waiting while the buffer is full.
+
+        Raises:
+            RuntimeError: If the scheduler was closed
+        """
+        if self._closed:
+            raise RuntimeError("Scheduler is closed")
+        while self._queued >= self.max_queued:
+            await self._wait()
+        domain = self.key(url)
+        state = self._domains.get(domain)
+        if state is None:
+            state = _DomainQueue(self.weights.get(domain, self.default_weight))
+            self._domains[domain] = state
+            self._ring.append(domain)
+        state.items.append(url)
+        self._queued += 1
+        self._notify()
+
+    def close(self) -> None:
+        """Signal that no more URLs will be queued."""
+        self._closed = True
+        self._notify()
+
+    def _next_ready(self, now: float) -> Optional[str]:
+        """Pop the next URL in round-robin order, or return None if none is ready."""
+        for _ in range(len(self._ring)):
+            if not self._ring:
+                break
+            domain = self._ring[0]
+            state = self._domains[domain]
+            ready = (
+                state.items
+                and (self.per_domain_concurrency is None or state.active < self.per_domain_concurrency)
+                and state.next_start <= now
+            )
+            if not ready:
+                if not state.items and state.active == 0 and state.next_start <= now:
+                    # Forget idle domains once their politeness delay has passed
+                    self._ring.popleft()
+                    del self._domains[domain]
+                    continue
+                state.turns = state.weight
+                self._ring.rotate(-1)
+                continue
+            url = state.items.popleft()
+            self._queued -= 1
+            state.active += 1
+            state.next_start = now + self.politeness_delay
+            state.turns -= 1
+            if state.turns <= 0 or not state.items:
+                state.turns = state.weight
+                self._ring.rotate(-1)
+            return url
+        return None
+
+    def _next_start_delay(self, now: float) -> Optional[float]:
+        delays = [
+            state.next_start - now
+            for state in self._domains.values()
+            if state.items
+            and (self.per_domain_concurrency is None or state.active < self.per_domain_concurrency)
+        ]
+        return max(0.0, min(delays)) if delays else None
+
+    async def get(self) -> Optional[str]:
+        """
+        Wait for the next URL to process.
+
+        Returns:
+            The next URL, or None once the scheduler is closed and drained
+        """
+        while True:
+            now = time.monotonic()
+            url = self._next_ready(now)
+            if url is not None:
+                self._notify()
+                return url
+            if self._closed and self._queued == 0:
+                return None
+            await self._wait(self._next_start_delay(now))
+
+    def done(self, url: str) -> None:
+        """Release the domain slot taken by a URL returned from get()."""
+        domain = self.key(url)
+        state = self._domains.get(domain)
+        if state is None or state.active == 0:
+            return
+        state.active -= 1
+        self._notify()
@@ -0,0 +1,531 @@
+"""
+Bulk processing sharded across worker processes
+
+A single process spends most of its time decoding JSON and handling results
+once responses arrive fast enough. The sharded runner splits the URL stream
+into chunks that worker processes request from the parent as they run out
+of work, so work is balanced across cores. Each worker runs its own AsyncUlfomClient and writes
+its own shard of the output, which merge_shards() combines afterwards.
+"""
+
+import asyncio
+import collections
+import glob
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import time
+from typing import Optional, Dict, Any, Iterable, Container, Callable, List, Sequence, Union, Deque, Tuple
+
+from .async_client import AsyncUlfomClient
+from .bulk import BulkStats, run_bulk, bulk_dispatcher, URL_SERVICE, TASK_SERVICE
+from .routing import normalize_base_urls
+from .sinks import ResultSink, open_sink, iter_records
+from .transport import AsyncTransport
+from .urls import DedupIndex, canonicalize_url
+
+_SUFFIXES = ('.jsonl.gz', '.json.gz', '.jsonl', '.json', '.parquet', '.gz')
+
+# Seconds a worker waits for a chunk before checking for cancellation
+_POLL = 0.5
+
+
+def _split_suffix(path: str) -> Tuple[str, str]:
+    for suffix in _SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)], suffix
+    return os.path.splitext(path)
+
+
+def shard_path(output: str, name: Union[int, str]) -> str:
+    """
+    Return the path of one shard of an output, e.g. ``out.shard-003.jsonl``.
+
+    Args:
+        output: Path of the merged output
+        name: Worker number, or a name for records written by the parent
+    """
+    root, suffix = _split_suffix(output)
+    if isinstance(name, int):
+        name = f"{name:03d}"
+    return f"{root}.shard-{name}{suffix}"
+
+
+def shard_paths(output: str) -> List[str]:
+    """Return the existing shards of an output."""
+    root, suffix = _split_suffix(output)
+    return sorted(glob.glob(f"{glob.escape(root)}.shard-*{glob.escape(suffix)}"))
+
+
+def merge_shards(output: str, remove: bool = True, **kwargs) -> int:
+    """
+    Append the records of every shard of an output to the output itself.
+
+    Args:
+        output: Path of the merged output
+        remove: Whether to delete the shards once merged
+        **kwargs: Additional arguments for open_sink()
+
+    Returns:
+        The number of records merged
+    """
+    paths = shard_paths(output)
+    if not paths:
+        return 0
+    count = 0
+    with open_sink(output, **kwargs) as sink:
+        for path in paths:
+            count += sink.consume(iter_records(path))
+    if remove:
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    return count
+
+
+class _ChunkTracker:
+    """Maps the records a worker writes back to the chunks they came from."""
+
+    def __init__(self, conn: Any, report_ok: bool):
+        self.conn = conn
+        self.report_ok = report_ok
+        self._chunk_of: Dict[str, Deque[int]] = collections.defaultdict(collections.deque)
+        self._pending: Dict[int, List[Any]] = {}
+        self._completed: List[int] = []
+
+    def take(self, chunk_id: int, urls: Sequence[str]) -> None:
+        for url in urls:
+            self._chunk_of[url].append(chunk_id)
+        # Remaining records, successes, failures and successful URLs
+        self._pending[chunk_id] = [len(urls), 0, 0, []]
+
+    def record(self, record: Dict[str, Any]) -> bool:
+        """Account for a written record; returns whether a chunk completed."""
+        url = record.get("url")
+        chunks = self._chunk_of.get(url)
+        if not chunks:
+            return False
+        chunk_id = chunks.popleft()
+        if not chunks:
+            del self._chunk_of[url]
+        entry = self._pending[chunk_id]
+        entry[0] -= 1
+        if record.get("status") == "ok":
+            entry[1] += 1
+            if self.report_ok:
+                entry[3].append(url)
+        else:
+            entry[2] += 1
+        if entry[0] == 0:
+            self._completed.append(chunk_id)
+            return True
+        return False
+
+    def acknowledge(self) -> None:
+        """Report completed chunks; call only once their records are flushed."""
+        completed, self._completed = self._completed, []
+        for chunk_id in completed:
+            _, succeeded, failed, ok_urls = self._pending.pop(chunk_id)
+            self.conn.send(("done", chunk_id, succeeded, failed, ok_urls))
+
+
+class _AckingSink:
+    """
+    Sink wrapper acknowledging chunks once their records are on disk.
+
+    The records of a completed chunk are flushed before it is acknowledged,
+    so a worker crash never loses acknowledged results.
+    """
+
+    def __init__(self, sink: ResultSink, tracker: _ChunkTracker):
+        self.sink = sink
+        self.tracker = tracker
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.sink.write(record)
+        if self.tracker.record(record):
+            self.flush()
+
+    def flush(self) -> None:
+        self.sink.flush()
+        self.tracker.acknowledge()
+
+
+async def _run_worker(config: Dict[str, Any], conn: Any) -> None:
+    loop = asyncio.get_running_loop()
+    tracker = _ChunkTracker(conn, config["report_ok"])
+
+    async def urls():
+        while True:
+            conn.send(("want",))
+            # Poll so a cancelled worker never leaves a thread blocked in recv()
+            while not await loop.run_in_executor(None, conn.poll, _POLL):
+                pass
+            chunk = conn.recv()
+            if chunk is None:
+                return
+            chunk_id, chunk_urls = chunk
+            tracker.take(chunk_id, chunk_urls)
+            for url in chunk_urls:
+                yield url
+
+    with open_sink(config["path"], batch_size=config["batch_size"]) as sink:
+        factory = config["transport"]
+        async with AsyncUlfomClient(
+            base_url=config["base_url"],
+            api_key=config["api_key"],
+            timeout=config["client_timeout"],
+            dispatcher=bulk_dispatcher(config["concurrency"]),
+            transport=factory() if factory is not None else None
+        ) as client:
+            await run_bulk(
+                client,
+                config["service"],
+                urls(),
+                _AckingSink(sink, tracker),
+                kind=config["kind"],
+                concurrency=config["concurrency"],
+                parameters=config["parameters"],
+                poll_interval=config["poll_interval"],
+                timeout=config["timeout"],
+                canonicalize=False,
+                dedup=False,
+                rate_limit=config["rate_limit"],
+                deadline=config["deadline"]
+            )
+
+
+def _worker_main(config: Dict[str, Any], conn: Any) -> None:
+    """
+    Entry point of a worker process.
+
+    Every worker talks to the parent over its own pipe. Nothing is shared
+    between workers, so one dying never leaves a lock held for the others.
+    """
+    try:
+        asyncio.run(_run_worker(config, conn))
+    except KeyboardInterrupt:
+        return
+    conn.send(("exit",))
+    conn.close()
+
+
+def run_sharded(
+    base_url: Union[str, Sequence[str]],
+    service: str,
+    urls: Iterable[str],
+    output: str,
+    api_key: Optional[str] = None,
+    client_timeout: int = 30,
+    processes: Optional[int] = None,
+    kind: str = URL_SERVICE,
+    concurrency: int = 64,
+    parameters: Optional[Dict[str, Any]] = None,
+    poll_interval: float = 1.0,
+    timeout: Optional[float] = None,
+    rate_limit: Optional[float] = None,
+    deadline: Optional[float] = None,
+    skip: Optional[Container[str]] = None,
+    canonicalize: bool = True,
+    dedup: bool = True,
+    index: Optional[Any] = None,
+    chunk_size: int = 256,
+    batch_size: int = 1000,
+    max_restarts: int = 3,
+    max_attempts: int = 3,
+    stats: Optional[BulkStats] = None,
+    progress: Optional[Callable[[BulkStats], None]] = None,
+    progress_interval: float = 0.5,
+    start_method: Optional[str] = None,
+    transport: Optional[Callable[[], AsyncTransport]] = None
+) -> BulkStats:
+    """
+    Run a stream of URLs through a service using several worker processes.
+
+    The parent canonicalizes, deduplicates and filters the input, then hands
+    it out in chunks over a pipe to each worker; idle workers ask for the
+    next chunk, so fast workers take on more. Every worker runs run_bulk() with
+    its own AsyncUlfomClient and writes ``shard_path(output, n)``; records
+    produced by the parent, such as invalid URLs, go to
+    ``shard_path(output, "main")``. Call merge_shards() to combine them.
+
+    A worker that dies is restarted up to ``max_restarts`` times. The chunks
+    it had taken are queued again, minus the URLs already in its shard, and
+    URLs of a chunk that crashed ``max_attempts`` workers are recorded as
+    errors.
+
+    Args:
+        base_url: The base URL of the Ulfom API, or a list of base URLs
+        service: The service name
+        urls: Iterable of URLs
+        output: Path of the merged output; selects the shard format
+        api_key: Optional API key
+        client_timeout: Request timeout in seconds
+        processes: Number of worker processes (default: number of CPUs)
+        kind: "url" for URL services or "task" for task services
+        concurrency: Maximum number of requests in flight per worker
+        parameters: Task parameters (task services only)
+        poll_interval: Task polling interval in seconds (task services only)
+        timeout: Per-task timeout in seconds (task services only)
+        rate_limit: Optional maximum number of URLs submitted per second
+            across all workers; each worker gets an equal share
+        deadline: Optional end-to-end deadline per URL in seconds; see
+            run_bulk()
+        skip: URLs to skip, e.g. those already present in the output
+        canonicalize: Whether to canonicalize URLs before submission
+        dedup: Whether to skip repeats of a URL within this run
+        index: Optional DedupIndex or BloomFilter persisted across runs;
+            URLs found in it are skipped and successful ones are added
+        chunk_size: Number of URLs handed to a worker at a time
+        batch_size: Records buffered per write in each shard
+        max_restarts: Restarts allowed per worker after a crash
+        max_attempts: Workers a chunk may crash before it is given up
+        stats: Optional BulkStats instance to update
+        progress: Optional callback receiving the stats periodically
+        progress_interval: Seconds between progress callbacks
+        start_method: multiprocessing start method (default: platform default)
+        transport: Optional picklable factory called in every worker to
+            create its AsyncTransport, e.g. to replay a recording offline
+
+    Returns:
+        The final BulkStats
+
+    Raises:
+        ValueError: If base_url, kind, processes, concurrency, chunk_size or
+            deadline is invalid
+        RuntimeError: If every worker crashed more than max_restarts times
+    """
+    normalize_base_urls(base_url)
+    if kind not in (URL_SERVICE, TASK_SERVICE):
+        raise ValueError(f"kind must be '{URL_SERVICE}' or '{TASK_SERVICE}'")
+    processes = processes or os.cpu_count() or 1
+    if processes < 1:
+        raise ValueError("processes must be positive")
+    if concurrency < 1:
+        raise ValueError("concurrency must be positive")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    if deadline is not None and deadline <= 0:
+        raise ValueError("deadline must be positive")
+
+    stats = stats or BulkStats()
+    context = multiprocessing.get_context(start_method)
+    config = {
+        "base_url": base_url,
+        "api_key": api_key,
+        "client_timeout": client_timeout,
+        "service": service,
+        "kind": kind,
+        "concurrency": concurrency,
+        "parameters": parameters,
+        "poll_interval": poll_interval,
+        "timeout": timeout,
+        "rate_limit": rate_limit / processes if rate_limit else None,
+        "deadline": deadline,
+        "batch_size": batch_size,
+        "report_ok": index is not None,
+        "transport": transport,
+    }
+
+    iterator = iter(urls)
+    seen = DedupIndex() if dedup else None
+    main_sink: List[ResultSink] = []
+    chunks: Dict[int, List[str]] = {}
+    pending: Deque[int] = collections.deque()
+    owner: Dict[int, int] = {}
+    attempts: Dict[int, int] = collections.defaultdict(int)
+    workers: Dict[int, Any] = {}
+    conns: Dict[int, Any] = {}
+    wanting: Deque[int] = collections.deque()
+    finished = set()
+    restarts: Dict[int, int] = collections.defaultdict(int)
+    next_id = 0
+    exhausted = False
+
+    def write_error(url: str, error: str) -> None:
+        if not main_sink:
+            main_sink.append(open_sink(shard_path(output, "main"), batch_size=batch_size))
+        main_sink[0].write({"url": url, "status": "error", "error": error})
+        stats.failed += 1
+
+    def read_chunk() -> Optional[List[str]]:
+        nonlocal exhausted
+        chunk = []
+        while len(chunk) < chunk_size:
+            url = next(iterator, None)
+            if url is None:
+                exhausted = True
+                break
+            if canonicalize:
+                try:
+                    url = canonicalize_url(url)
+                except ValueError as e:
+                    write_error(url, str(e))
+                    continue
+            if (skip is not None and url in skip) or (index is not None and url in index):
+                stats.skipped += 1
+                continue
+            if seen is not None and not seen.add(url):
+                stats.duplicates += 1
+                continue
+            chunk.append(url)
+        return chunk or None
+
+    def next_chunk() -> Optional[int]:
+        nonlocal next_id
+        if pending:
+            return pending.popleft()
+        if exhausted:
+            return None
+        chunk = read_chunk()
+        if chunk is None:
+            return None
+        chunks[next_id] = chunk
+        next_id += 1
+        return next_id - 1
+
+    def start(shard: int) -> None:
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_main,
+            args=(dict(config, path=shard_path(output, shard)), child_conn),
+            name=f"ulfom-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        workers[shard] = process
+        conns[shard] = parent_conn
+
+    def send(shard: int, message: Any) -> None:
+        try:
+            conns[shard].send(message)
+        except OSError:
+            # The worker died; recover() picks up the chunk it owned
+            pass
+
+    def dispatch() -> None:
+        """Hand chunks to the workers asking for work."""
+        while wanting:
+            shard = wanting[0]
+            chunk_id = next_chunk()
+            if chunk_id is None:
+                if exhausted and not chunks:
+                    send(shard, None)
+                    wanting.popleft()
+                    continue
+                # Crashed workers may still return work; keep this one waiting
+                return
+            wanting.popleft()
+            owner[chunk_id] = shard
+            send(shard, (chunk_id, chunks[chunk_id]))
+
+    def handle(shard: int, message: Any) -> None:
+        if message[0] == "want":
+            wanting.append(shard)
+        elif message[0] == "done":
+            _, chunk_id, succeeded, failed, ok_urls = message
+            chunk = chunks.pop(chunk_id)
+            owner.pop(chunk_id, None)
+            attempts.pop(chunk_id, None)
+            stats.submitted += len(chunk)
+            stats.succeeded += succeeded
+            stats.failed += failed
+            if index is not None:
+                for url in ok_urls:
+                    index.add(url)
+        elif message[0] == "exit":
+            finished.add(shard)
+
+    def receive(shard: int) -> bool:
+        """Handle every message waiting from a worker; returns False once its pipe is closed."""
+        conn = conns[shard]
+        try:
+            while conn.poll():
+                handle(shard, conn.recv())
+        except (EOFError, OSError):
+            return False
+        return True
+
+    def retire(shard: int) -> None:
+        conns.pop(shard).close()
+        del workers[shard]
+        if shard in wanting:
+            wanting.remove(shard)
+
+    def recover(shard: int) -> None:
+        """Requeue the work of a crashed worker and restart it."""
+        retire(shard)
+        lost = [chunk_id for chunk_id, taken_by in owner.items() if taken_by == shard]
+        written: Dict[str, str] = {}
+        if lost:
+            wanted = set(url for chunk_id in lost for url in chunks[chunk_id])
+            for record in iter_records(shard_path(output, shard)):
+                if record.get("url") in wanted:
+                    written[record["url"]] = record.get("status")
+        for chunk_id in lost:
+            del owner[chunk_id]
+            remaining = []
+            for url in chunks[chunk_id]:
+                status = written.get(url)
+                if status is None:
+                    remaining.append(url)
+                    continue
+                stats.submitted += 1
+                if status == "ok":
+                    stats.succeeded += 1
+                    if index is not None:
+                        index.add(url)
+                else:
+                    stats.failed += 1
+            attempts[chunk_id] += 1
+            if not remaining or attempts[chunk_id] >= max_attempts:
+                for url in remaining:
+                    write_error(url, "worker process crashed")
+                del chunks[chunk_id]
+                attempts.pop(chunk_id, None)
+            else:
+                chunks[chunk_id] = remaining
+                pending.appendleft(chunk_id)
+        if restarts[shard] < max_restarts:
+            restarts[shard] += 1
+            start(shard)
+
+    last_progress = time.monotonic()
+    try:
+        for shard in range(processes):
+            start(shard)
+        while workers:
+            dispatch()
+            ready = multiprocessing.connection.wait(
+                list(conns.values()) + [process.sentinel for process in workers.values()],
+                timeout=progress_interval
+            )
+            if ready:
+                for shard in list(workers):
+                    alive = receive(shard)
+                    if shard in finished:
+                        workers[shard].join()
+                        retire(shard)
+                    elif not alive or not workers[shard].is_alive():
+                        # Pick up everything the worker sent before dying
+                        receive(shard)
+                        workers[shard].join()
+                        recover(shard)
+            if progress is not None and time.monotonic() - last_progress >= progress_interval:
+                progress(stats)
+                last_progress = time.monotonic()
+        if chunks or pending or not exhausted:
+            raise RuntimeError("Every worker process crashed; rerun to resume")
+    finally:
+        for shard, process in list(workers.items()):
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            conns[shard].close()
+        if main_sink:
+            main_sink[0].close()
+    return stats
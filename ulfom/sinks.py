@@ -0,0 +1,414 @@
+"""
+Streaming result sinks for bulk Ulfom jobs
+"""
+
+import gzip
+import json
+import os
+import re
+import time
+import zlib
+from typing import Optional, Dict, Any, List, Iterable, Iterator, AsyncIterable
+
+
+class ResultSink:
+    """
+    Base class for incremental result writers.
+
+    Records are buffered in memory and written out in batches, so memory use
+    is bounded by ``batch_size`` no matter how large the job is. The buffer
+    is flushed when it reaches ``batch_size`` records, when ``flush_interval``
+    seconds have passed since the last flush, and on close.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 1000,
+        flush_interval: Optional[float] = 5.0,
+        fsync: bool = True
+    ):
+        """
+        Initialize the sink.
+
+        Args:
+            path: Output path
+            batch_size: Number of records to buffer before writing
+            flush_interval: Maximum seconds between flushes (None to disable)
+            fsync: Whether to fsync the output after every flush
+
+        Raises:
+            ValueError: If path is empty or batch_size is not positive
+        """
+        if not path:
+            raise ValueError("path cannot be empty")
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.count = 0
+        self.closed = False
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Buffer a single record, flushing if the batch is full or stale."""
+        if self.closed:
+            raise ValueError("I/O operation on closed sink")
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        elif (
+            self.flush_interval is not None
+            and time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Buffer several records."""
+        for record in records:
+            self.write(record)
+
+    def consume(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Write every record from an iterable and flush.
+
+        Returns:
+            The number of records written
+        """
+        start = self.count
+        self.write_many(records)
+        self.flush()
+        return self.count - start
+
+    async def aconsume(self, records: AsyncIterable[Dict[str, Any]]) -> int:
+        """
+        Write every record from an async iterable and flush.
+
+        Returns:
+            The number of records written
+        """
+        start = self.count
+        async for record in records:
+            self.write(record)
+        self.flush()
+        return self.count - start
+
+    def flush(self) -> None:
+        """Write out all buffered records."""
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._write_batch(batch)
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Flush remaining records and release the output."""
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            self._close()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'ResultSink':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def _dumps(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class JSONLSink(ResultSink):
+    """
+    Sink writing one JSON document per line.
+
+    The file is opened in append mode. If a previous run was interrupted
+    mid-line, the partial trailing line is truncated on open so the file
+    stays valid and the job can resume where it stopped.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        _truncate_partial_line(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        self._file.write(''.join(_dumps(record) + '\n' for record in batch))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class GzipJSONLSink(ResultSink):
+    """
+    Sink writing gzip-compressed JSONL.
+
+    Each batch is written as a complete gzip member. Concatenated members
+    form a valid gzip file, so an interrupted run loses at most the batch in
+    flight; an incomplete trailing member is dropped on open.
+    """
+
+    def __init__(self, path: str, compresslevel: int = 6, **kwargs):
+        super().__init__(path, **kwargs)
+        self.compresslevel = compresslevel
+        _truncate_partial_gzip(path)
+        self._file = open(path, 'ab')
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        data = ''.join(_dumps(record) + '\n' for record in batch).encode('utf-8')
+        self._file.write(gzip.compress(data, compresslevel=self.compresslevel))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink(ResultSink):
+    """
+    Sink writing Parquet part files into a directory. Requires ``pyarrow``.
+
+    Parquet files cannot be appended to, so every flush writes a new part
+    file (``part-00000.parquet``, ...) through a temporary name and an
+    atomic rename. The directory is always a readable dataset, and a resumed
+    run continues numbering after the highest existing part and removes
+    temporary files left by an interrupted write. Nested values (dicts and
+    lists) are stored as JSON strings to keep a flat schema.
+    """
+
+    def __init__(self, path: str, batch_size: int = 10000, **kwargs):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                "ParquetSink requires pyarrow; install it with `pip install pyarrow`"
+            )
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._next_part = _prepare_part_dir(path)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        # from_pylist() takes the columns from the first row only, so give
+        # every row all keys of the batch, e.g. both "result" and "error"
+        keys = list(dict.fromkeys(key for record in batch for key in record))
+        rows = [
+            {
+                key: _dumps(value) if isinstance(value, (dict, list)) else value
+                for key, value in ((key, record.get(key)) for key in keys)
+            }
+            for record in batch
+        ]
+        table = self._pa.Table.from_pylist(rows)
+        name = f"part-{self._next_part:05d}.parquet"
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        self._pq.write_table(table, tmp_path)
+        if self.fsync:
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, name))
+        self._next_part += 1
+
+
+def _is_part_file(name: str) -> bool:
+    return name.startswith('part-') and name.endswith('.parquet')
+
+
+_PART_NUMBER = re.compile(r'part-(\d+)\.parquet')
+_STALE_PART = re.compile(r'\.part-\d+\.parquet\.tmp')
+
+
+def _prepare_part_dir(path: str) -> int:
+    """
+    Create a part directory or clean up an existing one.
+
+    Temporary files of writes that never completed are removed. Returns the
+    number of the next part, one past the highest existing one, so parts
+    are never overwritten even when the numbering has gaps.
+    """
+    os.makedirs(path, exist_ok=True)
+    next_part = 0
+    for name in os.listdir(path):
+        if _STALE_PART.fullmatch(name):
+            os.remove(os.path.join(path, name))
+            continue
+        match = _PART_NUMBER.fullmatch(name)
+        if match:
+            next_part = max(next_part, int(match.group(1)) + 1)
+    return next_part
+
+
+def _truncate_partial_line(path: str) -> None:
+    """Drop any bytes after the last newline of an existing file."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            index = chunk.rfind(b'\n')
+            if index != -1:
+                end = pos + index + 1
+                if end != size:
+                    f.truncate(end)
+                return
+        f.truncate(0)
+
+
+def _iter_gzip_members(path: str, chunk_size: int = 65536) -> Iterator[Any]:
+    """Yield ``(end_offset, data)`` for every complete gzip member in a file."""
+    offset = 0
+    with open(path, 'rb') as f:
+        pending = b''
+        while True:
+            decompressor = zlib.decompressobj(wbits=31)
+            parts = []
+            consumed = 0
+            while not decompressor.eof:
+                if not pending:
+                    pending = f.read(chunk_size)
+                    if not pending:
+                        return
+                try:
+                    parts.append(decompressor.decompress(pending))
+                except zlib.error:
+                    return
+                consumed += len(pending) - len(decompressor.unused_data)
+                pending = decompressor.unused_data
+            offset += consumed
+            yield offset, b''.join(parts)
+
+
+def _truncate_partial_gzip(path: str) -> None:
+    """
+    Drop an incomplete trailing gzip member from an existing file.
+
+    Raises:
+        ValueError: If the file is not empty but holds no complete gzip
+            member, e.g. plain JSONL; it is left untouched
+    """
+    if not os.path.exists(path):
+        return
+    size = os.path.getsize(path)
+    valid = 0
+    for valid, _ in _iter_gzip_members(path):
+        pass
+    if valid == size:
+        return
+    if valid == 0:
+        raise ValueError(f"Existing output is not a gzip file: {path}")
+    with open(path, 'r+b') as f:
+        f.truncate(valid)
+
+
+def open_sink(path: str, format: Optional[str] = None, **kwargs) -> ResultSink:
+    """
+    Open a sink for the given path.
+
+    Args:
+        path: Output path
+        format: One of "jsonl", "jsonl.gz" or "parquet"; inferred from the
+            path extension when omitted
+        **kwargs: Additional arguments for the sink
+
+    Returns:
+        A ResultSink instance
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if format is None:
+        if path.endswith('.gz'):
+            format = 'jsonl.gz'
+        elif path.endswith('.parquet'):
+            format = 'parquet'
+        else:
+            format = 'jsonl'
+    if format == 'jsonl':
+        return JSONLSink(path, **kwargs)
+    if format == 'jsonl.gz':
+        return GzipJSONLSink(path, **kwargs)
+    if format == 'parquet':
+        return ParquetSink(path, **kwargs)
+    raise ValueError(f"Unknown sink format: {format}")
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read back the records written by a sink.
+
+    Incomplete trailing data left by an interrupted run is ignored, which
+    makes this suitable for finding already processed inputs on resume.
+
+    Args:
+        path: Path of a JSONL file, gzip JSONL file or Parquet directory
+
+    Yields:
+        The stored records
+    """
+    if not os.path.exists(path):
+        return
+    if os.path.isdir(path):
+        import pyarrow.parquet as pq
+        for name in sorted(os.listdir(path)):
+            if _is_part_file(name):
+                table = pq.read_table(os.path.join(path, name))
+                yield from table.to_pylist()
+        return
+    if path.endswith('.gz'):
+        for _, data in _iter_gzip_members(path):
+            for line in data.decode('utf-8').splitlines():
+                yield json.loads(line)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            yield json.loads(line)
+
+
+def latest_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read back the records written by a sink, keeping the last one per URL.
+
+    Outputs are append-only, so a URL run again, e.g. by ``ulfom bulk
+    --retry-failed``, has one record per attempt. Unlike iter_records(),
+    this holds one record per URL in memory.
+
+    Args:
+        path: Path of a JSONL file, gzip JSONL file or Parquet directory
+
+    Yields:
+        The last record of every URL, in the order those were written;
+        records without a URL are all kept
+    """
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for record in iter_records(path):
+        key = record["url"] if "url" in record else object()
+        # Re-insert so the order follows the last occurrence
+        latest.pop(key, None)
+        latest[key] = record
+    yield from latest.values()
@@ -0,0 +1,545 @@
+"""
+Transports carrying requests for UlfomClient and AsyncUlfomClient
+
+A transport sends one request to one endpoint and returns the decoded
+response. The clients keep routing, failover and priorities; the transport
+only moves bytes, so the same client and helper code runs against the real
+API, an in-memory fake or a recording.
+"""
+
+import asyncio
+import json as jsonlib
+import os
+import re
+import threading
+from typing import Optional, Dict, Any, List, Callable, Mapping, Union, Pattern
+
+import aiohttp
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from requests.structures import CaseInsensitiveDict
+from yarl import URL
+
+RECORD = "record"
+REPLAY = "replay"
+AUTO = "auto"
+
+
+class Response:
+    """A decoded API response."""
+
+    __slots__ = ('status', 'headers', 'data')
+
+    def __init__(self, status: int = 200, data: Any = None, headers: Optional[Mapping[str, str]] = None):
+        self.status = status
+        self.data = data
+        self.headers = CaseInsensitiveDict(headers or {})
+
+    def __repr__(self) -> str:
+        return f"Response(status={self.status}, data={self.data!r})"
+
+
+class Request:
+    """A request as seen by in-memory handlers."""
+
+    __slots__ = ('method', 'base_url', 'endpoint', 'params', 'json', 'headers', 'match', 'timeout')
+
+    def __init__(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        headers: Optional[Mapping[str, str]] = None,
+        match: Optional['re.Match'] = None,
+        timeout: Optional[float] = None
+    ):
+        self.method = method.upper()
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.params = params
+        self.json = json
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.match = match
+        self.timeout = timeout
+
+    def __repr__(self) -> str:
+        return f"Request({self.method} {self.endpoint})"
+
+
+class Transport:
+    """
+    Interface of the transport under UlfomClient.
+
+    ``request()`` must raise ``requests.exceptions.HTTPError`` for 4xx and
+    5xx responses, and ``requests.exceptions.ConnectionError`` or
+    ``requests.exceptions.Timeout`` when the endpoint cannot be reached, so
+    the client can fail over exactly as it does over HTTP.
+    """
+
+    def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        """Send a request to ``base_url + endpoint``."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release the resources held by the transport."""
+
+
+class AsyncTransport:
+    """
+    Interface of the transport under AsyncUlfomClient.
+
+    ``request()`` must raise ``aiohttp.ClientResponseError`` for 4xx and 5xx
+    responses, and ``aiohttp.ClientConnectionError`` or
+    ``asyncio.TimeoutError`` when the endpoint cannot be reached.
+    """
+
+    async def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        """Send a request to ``base_url + endpoint``."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release the resources held by the transport."""
+
+
+def http_error(status: int, method: str, url: str, data: Any = None) -> requests.exceptions.HTTPError:
+    """Build the error UlfomClient raises for an error response."""
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response._content = jsonlib.dumps(data).encode() if data is not None else b''
+    response.request = requests.Request(method, url).prepare()
+    return requests.exceptions.HTTPError(f"{status} Error for url: {url}", response=response)
+
+
+def client_response_error(status: int, method: str, url: str) -> aiohttp.ClientResponseError:
+    """Build the error AsyncUlfomClient raises for an error response."""
+    request_info = aiohttp.RequestInfo(URL(url), method, CIMultiDictProxy(CIMultiDict()), URL(url))
+    return aiohttp.ClientResponseError(request_info, (), status=status, message=f"{status} Error")
+
+
+class RequestsTransport(Transport):
+    """Sends requests over HTTP with the client's ``requests`` sessions."""
+
+    def __init__(self, session_for: Callable[[str], requests.Session]):
+        """
+        Args:
+            session_for: Returns the session to use for a base URL
+        """
+        self._session_for = session_for
+
+    def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        response = self._session_for(base_url).request(
+            method=method,
+            url=base_url + endpoint,
+            params=params,
+            json=json,
+            **kwargs
+        )
+        response.raise_for_status()
+        data = response.json() if response.status_code != 304 else None
+        result = Response(response.status_code, data)
+        result.headers = response.headers
+        return result
+
+
+class AiohttpTransport(AsyncTransport):
+    """Sends requests over HTTP with the client's aiohttp sessions."""
+
+    def __init__(self, session_for: Callable[[str], aiohttp.ClientSession]):
+        """
+        Args:
+            session_for: Returns the session to use for a base URL
+        """
+        self._session_for = session_for
+
+    async def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        async with self._session_for(base_url).request(
+            method=method,
+            url=base_url + endpoint,
+            params=params,
+            json=json,
+            **kwargs
+        ) as response:
+            response.raise_for_status()
+            data = await response.json() if response.status != 304 else None
+            result = Response(response.status, data)
+            result.headers = response.headers
+            return result
+
+
+Handler = Union[Response, Callable[[Request], Any], Any]
+
+
+def _as_response(result: Any) -> Response:
+    return result if isinstance(result, Response) else Response(200, result)
+
+
+class InMemoryTransport(Transport):
+    """
+    Serves requests from handlers registered in memory, without any network.
+
+    A handler is a fixed response (any JSON value, or a Response for other
+    status codes and headers) or a callable taking the Request and returning
+    one. Callables may also raise, e.g. ``requests.exceptions.ConnectionError``
+    to exercise failover. Requests without a handler get a 404. Every request
+    is appended to ``requests`` for assertions.
+    """
+
+    def __init__(self):
+        self._routes: List[tuple] = []
+        self._lock = threading.Lock()
+        self.requests: List[Request] = []
+
+    def add(self, method: str, endpoint: Union[str, Pattern], handler: Handler) -> None:
+        """
+        Register a handler.
+
+        Args:
+            method: HTTP method, or "*" for any method
+            endpoint: Exact endpoint path, or a compiled regular expression
+                that must match the whole path; its match is passed to
+                callables as ``request.match``
+            handler: Response, JSON value or callable
+        """
+        self._routes.append((method.upper(), endpoint, handler))
+
+    def route(self, method: str, endpoint: Union[str, Pattern]) -> Callable[[Callable], Callable]:
+        """Decorator form of add()."""
+        def register(handler: Callable) -> Callable:
+            self.add(method, endpoint, handler)
+            return handler
+        return register
+
+    def _handle(self, request: Request) -> Any:
+        """Return the result of the handler matching a request."""
+        with self._lock:
+            self.requests.append(request)
+        # Later registrations override earlier ones
+        for method, endpoint, handler in reversed(self._routes):
+            if method not in ('*', request.method):
+                continue
+            if isinstance(endpoint, str):
+                if endpoint != request.endpoint:
+                    continue
+            else:
+                request.match = endpoint.fullmatch(request.endpoint)
+                if request.match is None:
+                    continue
+            return handler(request) if callable(handler) else handler
+        return Response(404, {"detail": "Not Found"})
+
+    def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        request = Request(method, base_url, endpoint, params, json, kwargs.get('headers'), timeout=kwargs.get('timeout'))
+        response = _as_response(self._handle(request))
+        if response.status >= 400:
+            raise http_error(response.status, method, base_url + endpoint, response.data)
+        return response
+
+
+class AsyncInMemoryTransport(InMemoryTransport, AsyncTransport):
+    """
+    Async twin of InMemoryTransport.
+
+    Handlers may also be coroutine functions. With ``latency`` every request
+    sleeps that long, to model a slow server without any network.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+
+    async def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        timeout = getattr(kwargs.get('timeout'), 'total', None)
+        if self.latency:
+            if timeout is not None and self.latency > timeout:
+                # Behave like a real request running into its timeout
+                await asyncio.sleep(timeout)
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(self.latency)
+        result = self._handle(Request(method, base_url, endpoint, params, json, kwargs.get('headers'), timeout=timeout))
+        if asyncio.iscoroutine(result):
+            result = await result
+        response = _as_response(result)
+        if response.status >= 400:
+            raise client_response_error(response.status, method, base_url + endpoint)
+        return response
+
+    async def close(self) -> None:
+        pass
+
+
+class ReplayMissError(LookupError):
+    """Raised when a replayed request was never recorded."""
+
+
+def _request_key(method: str, endpoint: str, params: Optional[Dict[str, Any]], json: Any) -> str:
+    return jsonlib.dumps([method.upper(), endpoint, params or {}, json], sort_keys=True, default=str)
+
+
+class Cassette:
+    """
+    Recorded responses, stored one JSON object per line.
+
+    Requests are keyed by method, endpoint, query parameters and body, not
+    by base URL, so a recording replays against any endpoint. Identical
+    requests replay their responses in recorded order, and the last one
+    repeats once they run out, so a task polled more often than during the
+    recording stays in its final state.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> None:
+        """Read the recording, skipping an incomplete trailing line."""
+        self._responses.clear()
+        self._positions.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = jsonlib.loads(line)
+                except ValueError:
+                    continue
+                key = _request_key(entry["method"], entry["endpoint"], entry.get("params"), entry.get("json"))
+                self._responses.setdefault(key, []).append(entry)
+
+    def find(self, method: str, endpoint: str, params: Optional[Dict[str, Any]], json: Any) -> Optional[Response]:
+        """Return the next recorded response to a request, if any."""
+        key = _request_key(method, endpoint, params, json)
+        with self._lock:
+            entries = self._responses.get(key)
+            if not entries:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+        return Response(entry["status"], entry.get("data"), entry.get("headers"))
+
+    def record(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]],
+        json: Any,
+        response: Response
+    ) -> None:
+        """Append a response to the recording."""
+        entry = {
+            "method": method.upper(),
+            "endpoint": endpoint,
+            "params": params,
+            "json": json,
+            "status": response.status,
+            "headers": dict(response.headers),
+            "data": response.data,
+        }
+        line = jsonlib.dumps(entry, default=str) + "\n"
+        with self._lock:
+            key = _request_key(method, endpoint, params, json)
+            self._responses.setdefault(key, []).append(entry)
+            # Replaying the new entry right away would reorder later ones
+            self._positions[key] = len(self._responses[key])
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+    def truncate(self) -> None:
+        """Drop everything recorded so far."""
+        with self._lock:
+            self._responses.clear()
+            self._positions.clear()
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.path, 'w', encoding='utf-8')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _check_mode(mode: str) -> str:
+    if mode not in (RECORD, REPLAY, AUTO):
+        raise ValueError(f"mode must be '{RECORD}', '{REPLAY}' or '{AUTO}'")
+    return mode
+
+
+class RecordReplayTransport(Transport):
+    """
+    Records responses of another transport to disk and replays them.
+
+    In "record" mode every request goes to the inner transport and its
+    response, including error responses, is written to the cassette file.
+    In "replay" mode responses come only from the file and a request that
+    was never recorded raises ReplayMissError. "auto" replays what was
+    recorded and records the rest.
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, inner: Optional[Transport] = None):
+        """
+        Args:
+            path: Cassette file (JSON lines)
+            mode: "record", "replay" or "auto"
+            inner: Transport to record from; UlfomClient fills in its HTTP
+                transport when this is None
+
+        Raises:
+            ValueError: If mode is invalid
+        """
+        self.mode = _check_mode(mode)
+        self.inner = inner
+        self.cassette = Cassette(path)
+        if mode == RECORD:
+            self.cassette.truncate()
+        else:
+            self.cassette.load()
+
+    def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        if self.mode != RECORD:
+            response = self.cassette.find(method, endpoint, params, json)
+            if response is None and self.mode == REPLAY:
+                raise ReplayMissError(f"No recorded response for {method.upper()} {endpoint}")
+            if response is not None:
+                if response.status >= 400:
+                    raise http_error(response.status, method, base_url + endpoint, response.data)
+                return response
+        if self.inner is None:
+            raise RuntimeError("No inner transport to record from")
+        try:
+            response = self.inner.request(method, base_url, endpoint, params=params, json=json, **kwargs)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None:
+                try:
+                    data = e.response.json()
+                except ValueError:
+                    data = None
+                self.cassette.record(method, endpoint, params, json, Response(e.response.status_code, data))
+            raise
+        self.cassette.record(method, endpoint, params, json, response)
+        return response
+
+    def close(self) -> None:
+        self.cassette.close()
+        if self.inner is not None:
+            self.inner.close()
+
+
+class AsyncRecordReplayTransport(AsyncTransport):
+    """Async twin of RecordReplayTransport."""
+
+    def __init__(self, path: str, mode: str = REPLAY, inner: Optional[AsyncTransport] = None):
+        """
+        Args:
+            path: Cassette file (JSON lines)
+            mode: "record", "replay" or "auto"
+            inner: Transport to record from; AsyncUlfomClient fills in its
+                HTTP transport when this is None
+
+        Raises:
+            ValueError: If mode is invalid
+        """
+        self.mode = _check_mode(mode)
+        self.inner = inner
+        self.cassette = Cassette(path)
+        if mode == RECORD:
+            self.cassette.truncate()
+        else:
+            self.cassette.load()
+
+    async def request(
+        self,
+        method: str,
+        base_url: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        **kwargs
+    ) -> Response:
+        if self.mode != RECORD:
+            response = self.cassette.find(method, endpoint, params, json)
+            if response is None and self.mode == REPLAY:
+                raise ReplayMissError(f"No recorded response for {method.upper()} {endpoint}")
+            if response is not None:
+                if response.status >= 400:
+                    raise client_response_error(response.status, method, base_url + endpoint)
+                return response
+        if self.inner is None:
+            raise RuntimeError("No inner transport to record from")
+        try:
+            response = await self.inner.request(method, base_url, endpoint, params=params, json=json, **kwargs)
+        except aiohttp.ClientResponseError as e:
+            self.cassette.record(method, endpoint, params, json, Response(e.status, None))
+            raise
+        self.cassette.record(method, endpoint, params, json, response)
+        return response
+
+    async def close(self) -> None:
+        self.cassette.close()
+        if self.inner is not None:
+            await self.inner.close()
@@ -0,0 +1,257 @@
+"""
+URL preparation: canonicalization, encoding and deduplication
+"""
+
+import hashlib
+import math
+import os
+import struct
+from array import array
+from typing import Optional, Iterable
+from urllib.parse import urlsplit, urlunsplit, quote, unquote_to_bytes
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Characters left as-is when a URL is embedded in an API path. Everything
+# that would end the path or change its meaning (``?``, ``#``, ``%``, spaces)
+# is percent-encoded.
+_PATH_SAFE = ":/@!$'()*+,;-._~"
+
+# Characters allowed unescaped in the path of a canonical URL. ``%`` is kept
+# so existing escapes are not double-encoded.
+_CANONICAL_PATH_SAFE = "/:@!$&'()*+,;=-._~%"
+
+# Characters allowed unescaped in a query parameter of a canonical URL
+_CANONICAL_QUERY_SAFE = "/?:@!$'()*+,;=-._~%"
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Return the canonical form of a URL.
+
+    The scheme and host are lowercased, default ports and fragments are
+    dropped, query parameters are sorted by name, an empty path becomes
+    ``/`` and the path is percent-encoded consistently. Query parameters
+    keep their own encoding, and repeated names keep their order.
+
+    Args:
+        url: The URL to canonicalize
+
+    Returns:
+        The canonical URL
+
+    Raises:
+        ValueError: If the URL is not an absolute http(s) URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        raise ValueError(f"URL must start with http:// or https://: {url}")
+    host = (parts.hostname or '').rstrip('.')
+    if not host:
+        raise ValueError(f"URL has no host: {url}")
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo += ':' + parts.password
+        netloc = f"{userinfo}@{netloc}"
+    port = parts.port
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc += f":{port}"
+
+    path = quote(parts.path or '/', safe=_CANONICAL_PATH_SAFE)
+    path = _upper_escapes(path)
+    return urlunsplit((scheme, netloc, path, _canonical_query(parts.query), ''))
+
+
+def _canonical_query(query: str) -> str:
+    """
+    Sort query parameters by their decoded name.
+
+    Decoding and re-encoding the values would turn invalid UTF-8 escapes into
+    replacement characters and ``?flag`` into ``?flag=``, so every parameter
+    is kept as written apart from the case of its escapes. The sort is
+    stable, which keeps the values of a repeated name in their order.
+    """
+    params = [param for param in query.split('&') if param]
+    params.sort(key=lambda param: unquote_to_bytes(param.split('=', 1)[0].replace('+', ' ')))
+    return '&'.join(_upper_escapes(quote(param, safe=_CANONICAL_QUERY_SAFE)) for param in params)
+
+
+def _upper_escapes(value: str) -> str:
+    if '%' not in value:
+        return value
+    pieces = value.split('%')
+    return pieces[0] + ''.join(
+        '%' + (piece[:2].upper() + piece[2:] if len(piece) >= 2 else piece)
+        for piece in pieces[1:]
+    )
+
+
+def encode_url_path(url: str) -> str:
+    """
+    Percent-encode a URL for use as a segment of an API path.
+
+    ``/url/{service}/{url}`` routes would otherwise treat the query string
+    and fragment of the target URL as part of the API request.
+    """
+    return quote(url, safe=_PATH_SAFE)
+
+
+def url_hash(url: str) -> int:
+    """Return a stable 64-bit hash of a URL."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class DedupIndex:
+    """
+    Exact dedup index storing 64-bit hashes of URLs.
+
+    Only hashes are kept, so memory use per URL is independent of URL length.
+    The index can be saved and loaded to skip URLs across runs.
+    """
+
+    def __init__(self, urls: Optional[Iterable[str]] = None):
+        self._hashes = set()
+        for url in urls or ():
+            self.add(url)
+
+    def add(self, url: str) -> bool:
+        """
+        Add a URL to the index.
+
+        Returns:
+            True if the URL was not in the index yet
+        """
+        value = url_hash(url)
+        if value in self._hashes:
+            return False
+        self._hashes.add(value)
+        return True
+
+    def discard(self, url: str) -> None:
+        """Remove a URL from the index if present."""
+        self._hashes.discard(url_hash(url))
+
+    def __contains__(self, url: object) -> bool:
+        return isinstance(url, str) and url_hash(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def save(self, path: str) -> None:
+        """Write the index to a file, replacing it atomically."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            array('Q', self._hashes).tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DedupIndex':
+        """Load an index written by save(); a missing file gives an empty index."""
+        index = cls()
+        if os.path.exists(path):
+            values = array('Q')
+            with open(path, 'rb') as f:
+                values.frombytes(f.read())
+            index._hashes.update(values)
+        return index
+
+
+class BloomFilter:
+    """
+    Probabilistic dedup index with a fixed memory footprint.
+
+    Uses about ``-capacity * ln(error_rate) / ln(2)^2`` bits regardless of
+    how many URLs are added. Membership checks may return false positives
+    (a new URL reported as seen) at roughly ``error_rate`` once ``capacity``
+    URLs have been added, but never false negatives.
+    """
+
+    _HEADER = struct.Struct('>QQI')
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Initialize the filter.
+
+        Args:
+            capacity: Expected number of URLs
+            error_rate: Target false positive rate at capacity
+
+        Raises:
+            ValueError: If capacity or error_rate is out of range
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, url: str):
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, url: str) -> bool:
+        """
+        Add a URL to the filter.
+
+        Returns:
+            True if the URL was (probably) not in the filter yet
+        """
+        added = False
+        for position in self._positions(url):
+            byte, bit = divmod(position, 8)
+            mask = 1 << bit
+            if not self._bits[byte] & mask:
+                self._bits[byte] |= mask
+                added = True
+        if added:
+            self._count += 1
+        return added
+
+    def __contains__(self, url: object) -> bool:
+        if not isinstance(url, str):
+            return False
+        return all(
+            self._bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(url)
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+    def save(self, path: str) -> None:
+        """Write the filter to a file, replacing it atomically."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._HEADER.pack(self.num_bits, self._count, self.num_hashes))
+            f.write(self._bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, capacity: int = 1000000, error_rate: float = 0.001) -> 'BloomFilter':
+        """
+        Load a filter written by save().
+
+        A missing file gives an empty filter sized by capacity and error_rate.
+        """
+        bloom = cls(capacity, error_rate)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                num_bits, count, num_hashes = cls._HEADER.unpack(f.read(cls._HEADER.size))
+                bloom.num_bits = num_bits
+                bloom.num_hashes = num_hashes
+                bloom._count = count
+                bloom._bits = bytearray(f.read())
+        return bloom